@@ -9,7 +9,19 @@ setup(
     url="https://gitlab.ic.unicamp.br/ra156737/mc861-nes",
     include_package_data=True,
     packages=find_packages(),
-    install_requires=["attrs>=18.1", "click>=6.7"],
+    install_requires=["attrs>=18.2", "click>=6.7", "numpy"],
+    extras_require={
+        "display": ["pygame"],
+        "audio": ["sounddevice"],
+        "keyboard": ["pynput"],
+        "gamepad": ["evdev"],
+    },
     license="MIT",
-    entry_points={"console_scripts": ["pynesemu = src.main:cli"]},
+    entry_points={
+        "console_scripts": [
+            "pynesemu = src.main:cli",
+            "pynesemu-test = src.suite:cli",
+            "pynesemu-bench = src.bench:cli",
+        ]
+    },
 )
@@ -0,0 +1,551 @@
+import attr
+import logging
+import numpy as np
+import struct
+
+from .cpu import FREQUENCY
+from .ppu import CYCLES_PER_FRAME
+
+log = logging.getLogger(__name__)
+
+RATE = 44100
+
+LENGTHS = [
+    10, 254, 20, 2, 40, 4, 80, 6, 160, 8, 60, 10, 14, 12, 26, 14,
+    12, 16, 24, 18, 48, 20, 96, 22, 192, 24, 72, 26, 16, 28, 32, 30,
+]  # fmt: skip
+NOISE_PERIODS = [
+    4, 8, 16, 32, 64, 96, 128, 160,
+    202, 254, 380, 508, 762, 1016, 2034, 4068,
+]  # fmt: skip
+DMC_RATES = [
+    428, 380, 340, 320, 286, 254, 226, 214,
+    190, 160, 142, 128, 106, 84, 72, 54,
+]  # fmt: skip
+
+# waveforms: pulse duty cycles, triangle steps and the noise shift register
+# output for both modes, all indexed by the position of the channel sequencer
+DUTIES = np.array(
+    [
+        [0, 1, 0, 0, 0, 0, 0, 0],
+        [0, 1, 1, 0, 0, 0, 0, 0],
+        [0, 1, 1, 1, 1, 0, 0, 0],
+        [1, 0, 0, 1, 1, 1, 1, 1],
+    ],
+    dtype=np.intp,
+)
+TRIANGLE = np.concatenate([np.arange(15, -1, -1), np.arange(16)])
+
+
+def lfsr(tap):
+    # one period of the noise output (1 when bit 0 of the register is clear)
+    register, output = 1, []
+    while True:
+        output.append(~register & 1)
+        feedback = (register ^ (register >> tap)) & 1
+        register = (register >> 1) | (feedback << 14)
+        if register == 1:
+            return np.array(output, dtype=np.intp)
+
+
+NOISE = [lfsr(1), lfsr(6)]
+
+# nonlinear mixer: pulse 1 + pulse 2 and 3 * triangle + 2 * noise + dmc
+PULSE_MIX = np.array([0] + [95.52 / (8128 / n + 100) for n in range(1, 31)])
+TND_MIX = np.array([0] + [163.67 / (24329 / n + 100) for n in range(1, 203)])
+
+# frame counter: (cycle, quarter frame, half frame) steps and the period
+SEQUENCES = [
+    ([(7457, 1, 0), (14913, 1, 1), (22371, 1, 0), (29829, 1, 1)], 29830),
+    ([(7457, 1, 0), (14913, 1, 1), (22371, 1, 0), (37281, 1, 1)], 37282),
+]
+FRAME_IRQ = 29829
+
+STATE = struct.Struct("<qdqqqqqq")
+
+
+def fields(channel):
+    # names of the numeric state of a channel
+    names = [f.name for f in attr.fields(type(channel))]
+    return [name for name in names if name not in ("read", "bits", "envelope")]
+
+
+@attr.s
+class Envelope(object):
+    start = attr.ib(default=0)
+    divider = attr.ib(default=0)
+    decay = attr.ib(default=0)
+
+    def clock(self, period, loop):
+        if self.start:
+            self.start, self.decay, self.divider = 0, 15, period
+        elif self.divider:
+            self.divider -= 1
+        else:
+            self.divider = period
+            if self.decay:
+                self.decay -= 1
+            elif loop:
+                self.decay = 15
+
+
+@attr.s
+class Pulse(object):
+    # negate of pulse 1 subtracts one more (ones' complement)
+    carry = attr.ib(default=0)
+    enabled = attr.ib(default=0)
+    duty = attr.ib(default=0)
+    halt = attr.ib(default=0)
+    constant = attr.ib(default=0)
+    volume = attr.ib(default=0)
+    sweep = attr.ib(default=0)
+    sweep_period = attr.ib(default=0)
+    negate = attr.ib(default=0)
+    shift = attr.ib(default=0)
+    sweep_reload = attr.ib(default=0)
+    sweep_divider = attr.ib(default=0)
+    timer = attr.ib(default=0)
+    length = attr.ib(default=0)
+    phase = attr.ib(default=0.0)
+    envelope = attr.ib(factory=Envelope)
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.duty = value >> 6
+            self.halt = (value >> 5) & 1
+            self.constant = (value >> 4) & 1
+            self.volume = value & 0x0F
+        elif reg == 1:
+            self.sweep = value >> 7
+            self.sweep_period = (value >> 4) & 0x07
+            self.negate = (value >> 3) & 1
+            self.shift = value & 0x07
+            self.sweep_reload = 1
+        elif reg == 2:
+            self.timer = (self.timer & 0x0700) | value
+        else:
+            self.timer = (self.timer & 0x00FF) | ((value & 0x07) << 8)
+            if self.enabled:
+                self.length = LENGTHS[value >> 3]
+            self.phase = 0.0
+            self.envelope.start = 1
+
+    def quarter(self):
+        self.envelope.clock(self.volume, self.halt)
+
+    def half(self):
+        if self.length and not self.halt:
+            self.length -= 1
+        target = self.target()
+        if self.sweep_divider == 0 and self.sweep and self.shift:
+            if self.timer >= 8 and target <= 0x07FF:
+                self.timer = target
+        if self.sweep_divider == 0 or self.sweep_reload:
+            self.sweep_divider, self.sweep_reload = self.sweep_period, 0
+        else:
+            self.sweep_divider -= 1
+
+    def target(self):
+        change = self.timer >> self.shift
+        if self.negate:
+            return self.timer - change - self.carry
+        return self.timer + change
+
+    def render(self, count, step):
+        # step is the number of CPU cycles between samples
+        if not self.length or self.timer < 8 or self.target() > 0x07FF:
+            return np.zeros(count, dtype=np.intp)
+        volume = self.volume if self.constant else self.envelope.decay
+        speed = step / (2 * (self.timer + 1))
+        positions = (self.phase + speed * np.arange(count)).astype(np.intp)
+        self.phase = (self.phase + speed * count) % 8
+        return DUTIES[self.duty][positions & 7] * volume
+
+
+@attr.s
+class Triangle(object):
+    enabled = attr.ib(default=0)
+    control = attr.ib(default=0)
+    reload = attr.ib(default=0)
+    timer = attr.ib(default=0)
+    length = attr.ib(default=0)
+    linear = attr.ib(default=0)
+    linear_reload = attr.ib(default=0)
+    phase = attr.ib(default=0.0)
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.control = value >> 7
+            self.reload = value & 0x7F
+        elif reg == 2:
+            self.timer = (self.timer & 0x0700) | value
+        elif reg == 3:
+            self.timer = (self.timer & 0x00FF) | ((value & 0x07) << 8)
+            if self.enabled:
+                self.length = LENGTHS[value >> 3]
+            self.linear_reload = 1
+
+    def quarter(self):
+        if self.linear_reload:
+            self.linear = self.reload
+        elif self.linear:
+            self.linear -= 1
+        if not self.control:
+            self.linear_reload = 0
+
+    def half(self):
+        if self.length and not self.control:
+            self.length -= 1
+
+    def render(self, count, step):
+        # a silenced triangle holds its output instead of dropping to 0
+        position = int(self.phase)
+        if not self.length or not self.linear or self.timer < 2:
+            return np.full(count, TRIANGLE[position], dtype=np.intp)
+        speed = step / (self.timer + 1)
+        positions = (self.phase + speed * np.arange(count)).astype(np.intp)
+        self.phase = (self.phase + speed * count) % 32
+        return TRIANGLE[positions & 31]
+
+
+@attr.s
+class Noise(object):
+    enabled = attr.ib(default=0)
+    halt = attr.ib(default=0)
+    constant = attr.ib(default=0)
+    volume = attr.ib(default=0)
+    mode = attr.ib(default=0)
+    period = attr.ib(default=NOISE_PERIODS[0])
+    length = attr.ib(default=0)
+    phase = attr.ib(default=0.0)
+    envelope = attr.ib(factory=Envelope)
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.halt = (value >> 5) & 1
+            self.constant = (value >> 4) & 1
+            self.volume = value & 0x0F
+        elif reg == 2:
+            self.mode = value >> 7
+            self.period = NOISE_PERIODS[value & 0x0F]
+        elif reg == 3:
+            if self.enabled:
+                self.length = LENGTHS[value >> 3]
+            self.envelope.start = 1
+
+    def quarter(self):
+        self.envelope.clock(self.volume, self.halt)
+
+    def half(self):
+        if self.length and not self.halt:
+            self.length -= 1
+
+    def render(self, count, step):
+        if not self.length:
+            return np.zeros(count, dtype=np.intp)
+        volume = self.volume if self.constant else self.envelope.decay
+        sequence = NOISE[self.mode]
+        speed = step / self.period
+        positions = (self.phase + speed * np.arange(count)).astype(np.intp)
+        self.phase = (self.phase + speed * count) % len(sequence)
+        return sequence[positions % len(sequence)] * volume
+
+
+@attr.s
+class DMC(object):
+    # delta modulation: every bit of the sample moves the level by 2
+    read = attr.ib(default=None, repr=False)
+    irq = attr.ib(default=0)
+    loop = attr.ib(default=0)
+    rate = attr.ib(default=DMC_RATES[0])
+    level = attr.ib(default=0)
+    start = attr.ib(default=0xC000)
+    size = attr.ib(default=1)
+    address = attr.ib(default=0xC000)
+    remaining = attr.ib(default=0)
+    interrupt = attr.ib(default=0)
+    phase = attr.ib(default=0.0)
+    # fetched bits not played yet
+    bits = attr.ib(factory=lambda: np.zeros(0, dtype=np.uint8), repr=False)
+
+    def write(self, reg, value):
+        if reg == 0:
+            self.irq = value >> 7
+            self.loop = (value >> 6) & 1
+            self.rate = DMC_RATES[value & 0x0F]
+            if not self.irq:
+                self.interrupt = 0
+        elif reg == 1:
+            self.level = value & 0x7F
+        elif reg == 2:
+            self.start = 0xC000 | (value << 6)
+        else:
+            self.size = (value << 4) | 1
+
+    def restart(self):
+        self.address, self.remaining = self.start, self.size
+
+    def render(self, count, step):
+        # bits played up to each sample
+        played = self.phase + step / self.rate * np.arange(1, count + 1)
+        played = played.astype(np.intp)
+        total = int(played[-1])
+        self.phase += step / self.rate * count - total
+
+        if len(self.bits) < total:
+            fetched = self.__fetch((total - len(self.bits) + 7) >> 3)
+            self.bits = np.concatenate([self.bits, fetched])
+        bits, self.bits = self.bits[:total], self.bits[total:]
+        if not len(bits):
+            return np.full(count, self.level, dtype=np.intp)
+
+        # levels are clamped as a whole rather than per step
+        levels = self.level + np.cumsum(np.where(bits, 2, -2))
+        levels = np.concatenate([[self.level], np.clip(levels, 0, 127)])
+        self.level = int(levels[-1])
+        return levels[np.minimum(played, len(bits))]
+
+    def __fetch(self, count):
+        # bits of the next count bytes of the sample, lsb first
+        data = []
+        while len(data) < count and self.remaining:
+            data.append(self.read(self.address))
+            self.address = 0x8000 | ((self.address + 1) & 0x7FFF)
+            self.remaining -= 1
+            if not self.remaining and self.loop:
+                self.restart()
+            elif not self.remaining and self.irq:
+                self.interrupt = 1
+        return np.unpackbits(np.array(data, dtype=np.uint8), bitorder="little")
+
+
+@attr.s
+class APU(object):
+    # register writes are kept with the cycle they happened and replayed once
+    # per frame: between two writes or frame counter steps every channel is
+    # constant, so each span of samples is rendered as a whole with NumPy
+    rate = attr.ib(default=RATE)
+
+    def setup(self, bus, scheduler, clock, irq=None, dma=None, output=None, ports=None):
+        # clock() is the CPU cycle count, dma(page) handles writes to $4014,
+        # output(samples) takes the float32 samples of every frame and ports
+        # are the controllers at $4016 and $4017
+        self.scheduler, self.clock, self.irq = scheduler, clock, irq
+        self.dma, self.output, self.ports = dma, output, ports
+        self.step = FREQUENCY / self.rate
+
+        self.pulses = [Pulse(carry=1), Pulse()]
+        self.triangle = Triangle()
+        self.noise = Noise()
+        self.dmc = DMC(bus.read)
+        self.channels = self.pulses + [self.triangle, self.noise]
+
+        self.writes = []
+        self.chunks = []
+        self.samples = np.zeros(0, dtype=np.float32)
+        self.now, self.next_sample = clock(), float(clock())
+        self.sequence_start, self.sequence_step = clock(), 0
+        self.mode = self.inhibit = self.frame_irq = 0
+        self.next_frame = clock() + CYCLES_PER_FRAME
+        self.events = {}
+        self.__schedule()
+
+        bus.map(0x4000, 0x4100, handler=self)
+        log.debug("APU at %d Hz", self.rate)
+
+    def read(self, addr):
+        if addr in (0x4016, 0x4017) and self.ports is not None:
+            return self.ports.read(addr)
+        if addr != 0x4015:
+            return self.peek(addr)
+        self.flush(self.clock())
+        value = self.peek(addr)
+        self.frame_irq = 0
+        return value
+
+    def peek(self, addr):
+        if addr in (0x4016, 0x4017) and self.ports is not None:
+            return self.ports.peek(addr)
+        if addr != 0x4015:
+            return 0
+        value = sum(1 << i for i, c in enumerate(self.channels) if c.length)
+        value |= (self.dmc.remaining > 0) << 4
+        return value | (self.frame_irq << 6) | (self.dmc.interrupt << 7)
+
+    def write(self, addr, data):
+        if addr == 0x4014:
+            if self.dma is not None:
+                self.dma(data)
+            return
+        if addr == 0x4016 and self.ports is not None:
+            self.ports.write(data)
+        if addr > 0x4017 or addr == 0x4016:
+            return
+
+        cycle = self.clock()
+        self.writes.append((cycle, addr, data))
+        if addr == 0x4017:
+            # the frame IRQ is scheduled right away, the rest on replay
+            self.inhibit = (data >> 6) & 1
+            if self.inhibit:
+                self.frame_irq = 0
+            self.__schedule_irq(cycle, data >> 7)
+
+    def flush(self, cycle):
+        # renders the samples up to cycle, replaying the pending writes
+        writes, self.writes = self.writes, []
+        for when, addr, data in writes:
+            self.__advance(when)
+            self.__apply(addr, data)
+        self.__advance(cycle)
+
+    def save_state(self):
+        self.flush(self.clock())
+        registers = STATE.pack(
+            self.now,
+            self.next_sample,
+            self.sequence_start,
+            self.sequence_step,
+            self.mode,
+            self.inhibit,
+            self.frame_irq,
+            self.next_frame,
+        )
+        numbers = [getattr(c, n) for c in self.__components() for n in fields(c)]
+        return registers + struct.pack("<{}d".format(len(numbers)), *numbers)
+
+    def load_state(self, data):
+        (
+            self.now,
+            self.next_sample,
+            self.sequence_start,
+            self.sequence_step,
+            self.mode,
+            self.inhibit,
+            self.frame_irq,
+            self.next_frame,
+        ) = STATE.unpack_from(data)
+        numbers = memoryview(data)[STATE.size :].cast("d")
+        index = 0
+        for channel in self.__components():
+            for name in fields(channel):
+                kind = type(getattr(channel, name))
+                setattr(channel, name, kind(numbers[index]))
+                index += 1
+        # samples rendered before the load belong to another timeline, the
+        # next frame starts at the restored point
+        self.writes = []
+        self.chunks = []
+        self.samples = np.zeros(0, dtype=np.float32)
+        self.dmc.bits = self.dmc.bits[:0]
+        self.__schedule()
+
+    def __components(self):
+        envelopes = [self.pulses[0].envelope, self.pulses[1].envelope]
+        envelopes.append(self.noise.envelope)
+        return self.channels + [self.dmc] + envelopes
+
+    def __schedule(self):
+        for event in self.events.values():
+            self.scheduler.cancel(event)
+        self.events = {"frame": self.scheduler.schedule(self.next_frame, self.__frame)}
+        self.__schedule_irq(self.sequence_start, self.mode)
+
+    def __schedule_irq(self, start, mode):
+        event = self.events.pop("irq", None)
+        if event is not None:
+            self.scheduler.cancel(event)
+        if mode == 0 and not self.inhibit:
+            cycle = start + FRAME_IRQ
+            while cycle < self.clock():
+                cycle += SEQUENCES[0][1]
+            self.events["irq"] = self.scheduler.schedule(cycle, self.__frame_irq)
+
+    def __frame(self, cycle):
+        self.flush(cycle)
+        # a state loaded at the frame boundary leaves nothing to render
+        chunks = self.chunks or [np.zeros(0, dtype=np.float32)]
+        self.samples = np.concatenate(chunks).astype(np.float32)
+        self.chunks = []
+        if self.output is not None:
+            self.output(self.samples)
+        if self.dmc.interrupt:
+            self.__interrupt(cycle)
+        self.next_frame = cycle + CYCLES_PER_FRAME
+        self.events["frame"] = self.scheduler.schedule(self.next_frame, self.__frame)
+
+    def __frame_irq(self, cycle):
+        self.frame_irq = 1
+        self.__interrupt(cycle)
+        next_irq = cycle + SEQUENCES[0][1]
+        self.events["irq"] = self.scheduler.schedule(next_irq, self.__frame_irq)
+
+    def __interrupt(self, cycle):
+        # the line stays asserted while masked, checked again every scanline
+        if self.irq is None or "retry" in self.events:
+            return
+        if (self.frame_irq or self.dmc.interrupt) and not self.irq():
+            self.events["retry"] = self.scheduler.schedule(cycle + 113, self.__retry)
+
+    def __retry(self, cycle):
+        del self.events["retry"]
+        self.__interrupt(cycle)
+
+    def __advance(self, cycle):
+        # renders up to cycle, clocking the frame counter steps on the way
+        steps, period = SEQUENCES[self.mode]
+        while True:
+            offset, quarter, half = steps[self.sequence_step]
+            due = self.sequence_start + offset
+            if due > cycle:
+                break
+            self.__render(due)
+            self.__clock(quarter, half)
+            self.sequence_step += 1
+            if self.sequence_step == len(steps):
+                self.sequence_step = 0
+                self.sequence_start += period
+        self.__render(cycle)
+
+    def __clock(self, quarter, half):
+        if quarter:
+            for channel in self.channels:
+                channel.quarter()
+        if half:
+            for channel in self.channels:
+                channel.half()
+
+    def __render(self, cycle):
+        count = int(np.ceil((cycle - self.next_sample) / self.step))
+        self.now = cycle
+        if count <= 0:
+            return
+        self.next_sample += count * self.step
+
+        step = self.step
+        pulses = self.pulses[0].render(count, step) + self.pulses[1].render(count, step)
+        tnd = 3 * self.triangle.render(count, step)
+        tnd += 2 * self.noise.render(count, step) + self.dmc.render(count, step)
+        self.chunks.append(PULSE_MIX[pulses] + TND_MIX[tnd])
+
+    def __apply(self, addr, data):
+        if addr < 0x4010:
+            channel = self.channels[(addr - 0x4000) >> 2]
+            channel.write(addr & 0x03, data)
+        elif addr < 0x4014:
+            self.dmc.write(addr & 0x03, data)
+        elif addr == 0x4015:
+            for i, channel in enumerate(self.channels):
+                channel.enabled = (data >> i) & 1
+                if not channel.enabled:
+                    channel.length = 0
+            self.dmc.interrupt = 0
+            if not data & 0x10:
+                self.dmc.remaining = 0
+            elif not self.dmc.remaining:
+                self.dmc.restart()
+        elif addr == 0x4017:
+            self.mode = data >> 7
+            self.sequence_start, self.sequence_step = self.now, 0
+            if self.mode:
+                self.__clock(1, 1)
@@ -0,0 +1,159 @@
+import attr
+import logging
+import numpy as np
+import threading
+import time
+
+from .apu import RATE
+
+log = logging.getLogger(__name__)
+
+# largest change of the playback rate made to steer the buffer fill level
+MAX_DELTA = 0.005
+
+
+def resample(samples, count):
+    # linear interpolation of samples into count samples
+    if count == len(samples) or not len(samples):
+        return samples
+    positions = np.linspace(0, len(samples) - 1, count)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+@attr.s
+class NullAudio(object):
+    # headless sink, samples are only counted
+    rate = attr.ib(default=RATE)
+    samples = attr.ib(default=0, init=False)
+    underruns = attr.ib(default=0, init=False)
+    overruns = attr.ib(default=0, init=False)
+
+    def open(self):
+        pass
+
+    def write(self, samples):
+        self.samples += len(samples)
+
+    def close(self):
+        pass
+
+
+@attr.s
+class AudioSink(object):
+    # ring buffer between the emulator, which writes a frame of samples at a
+    # time without blocking, and the audio device thread that drains it; every
+    # frame is stretched by up to MAX_DELTA to keep latency seconds buffered,
+    # which absorbs the drift between the emulated and the device clocks
+    rate = attr.ib(default=RATE)
+    latency = attr.ib(default=0.05)
+
+    def __attrs_post_init__(self):
+        self.target = int(self.rate * self.latency)
+        self.capacity = 4 * self.target
+        self.buffer = np.zeros(self.capacity, dtype=np.float32)
+        self.start = self.size = 0
+        self.lock = threading.Lock()
+        self.samples = self.underruns = self.overruns = 0
+        # APU output is unipolar, its average is removed across frames
+        self.dc = None
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, samples):
+        # called by the emulator once per frame, never waits for the device
+        mean = float(samples.mean()) if len(samples) else 0.0
+        self.dc = mean if self.dc is None else 0.95 * self.dc + 0.05 * mean
+        error = min(1.0, max(-1.0, (self.size - self.target) / self.target))
+        count = int(round(len(samples) * (1 - MAX_DELTA * error)))
+        samples = resample(samples, count) - self.dc
+
+        with self.lock:
+            free = self.capacity - self.size
+            if len(samples) > free:
+                self.overruns += 1
+                samples = samples[:free]
+            end = (self.start + self.size) % self.capacity
+            first = min(len(samples), self.capacity - end)
+            self.buffer[end : end + first] = samples[:first]
+            self.buffer[: len(samples) - first] = samples[first:]
+            self.size += len(samples)
+            self.samples += len(samples)
+
+    def read(self, count):
+        # called from the device thread, missing samples are silence
+        output = np.zeros(count, dtype=np.float32)
+        with self.lock:
+            available = min(count, self.size)
+            first = min(available, self.capacity - self.start)
+            output[:first] = self.buffer[self.start : self.start + first]
+            output[first:available] = self.buffer[: available - first]
+            self.start = (self.start + available) % self.capacity
+            self.size -= available
+            if available < count:
+                self.underruns += 1
+        return output
+
+
+@attr.s
+class PygameAudio(AudioSink):
+    # pygame has no pull callback: a thread queues a block on the mixer
+    # channel whenever its queue is free
+    block = attr.ib(default=512)
+
+    def open(self):
+        import pygame
+
+        self.pygame = pygame
+        pygame.mixer.init(self.rate, -16, 1, self.block)
+        self.channel = pygame.mixer.Channel(0)
+        self.running = True
+        self.thread = threading.Thread(target=self.__drain, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.pygame.mixer.quit()
+        log.info("audio underruns: %d, overruns: %d", self.underruns, self.overruns)
+
+    def __drain(self):
+        period = self.block / self.rate / 4
+        while self.running:
+            if self.channel.get_queue() is None:
+                samples = np.clip(self.read(self.block), -1, 1) * 32767
+                sound = self.pygame.mixer.Sound(buffer=samples.astype(np.int16))
+                if self.channel.get_busy():
+                    self.channel.queue(sound)
+                else:
+                    self.channel.play(sound)
+            time.sleep(period)
+
+
+@attr.s
+class SoundDeviceAudio(AudioSink):
+    # the sounddevice callback reads straight from the ring buffer
+    block = attr.ib(default=256)
+
+    def open(self):
+        import sounddevice
+
+        self.stream = sounddevice.OutputStream(
+            samplerate=self.rate,
+            blocksize=self.block,
+            channels=1,
+            dtype="float32",
+            callback=self.__callback,
+        )
+        self.stream.start()
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+        log.info("audio underruns: %d, overruns: %d", self.underruns, self.overruns)
+
+    def __callback(self, outdata, frames, time, status):
+        outdata[:, 0] = self.read(frames)
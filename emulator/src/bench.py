@@ -0,0 +1,175 @@
+import attr
+import click
+import json
+import platform
+import time
+
+from .bus import BUS
+from .cpu import CPU, FREQUENCY
+from .opcodes import MODIFIES, OPCODES, READS, WRITES
+
+START = 0xC000
+COPIES = 64
+
+# operands used by the synthetic programs: zero page 0x10 points to 0x0200
+OPERANDS = {"imm": 0x01, "zp": 0x10, "zpx": 0x10, "zpy": 0x10, "indx": 0x10}
+OPERANDS.update({"indy": 0x10, "rel": 0x00, "abs": 0x0200, "absx": 0x0200})
+OPERANDS.update({"absy": 0x0200, "ind": 0x0300})
+
+# stack instructions are measured together with their counterpart
+PAIRS = {"pha": "pla", "php": "plp", "jsr": "rts"}
+SKIP = {"brk", "rti", "pla", "plp", "rts"}
+CODES = {(op.mnemonic, op.mode): op.code for op in OPCODES if op is not None}
+
+
+def kind(op):
+    if op.mnemonic in READS:
+        return "read"
+    if op.mnemonic in WRITES:
+        return "write"
+    if op.mnemonic in MODIFIES:
+        return "modify"
+    return "other"
+
+
+def encode(op):
+    if op.mnemonic == "jmp" and op.mode == "abs":
+        operand = START
+    else:
+        operand = OPERANDS.get(op.mode)
+    if op.size == 1:
+        return [op.code]
+    if op.size == 2:
+        return [op.code, operand]
+    return [op.code, operand & 0xFF, operand >> 8]
+
+
+def program(op):
+    # COPIES instructions followed by a jump back to the start
+    if op.mnemonic == "jsr":
+        # jsr sub; jmp start; sub: rts
+        sub = START + 6
+        jump = [0x4C, START & 0xFF, START >> 8]
+        return [op.code, sub & 0xFF, sub >> 8] + jump + [CODES["rts", "imp"]]
+
+    body = []
+    for _ in range(COPIES):
+        body += encode(op)
+        if op.mnemonic in PAIRS:
+            body.append(CODES[PAIRS[op.mnemonic], "imp"])
+    return body + [0x4C, START & 0xFF, START >> 8]
+
+
+def make_cpu(body):
+    rom = bytearray(0x4000)
+    rom[: len(body)] = body
+    rom[0x3FFC:0x3FFE] = START.to_bytes(2, "little")
+    cpu = CPU()
+    cpu.setup(BUS(), rom)
+    # pointers used by the indirect modes
+    cpu.bus.write_block((0x0010, 0x0012), [0x00, 0x02])
+    cpu.bus.write_block((0x0300, 0x0302), [START & 0xFF, START >> 8])
+    return cpu
+
+
+@attr.s
+class Result(object):
+    instructions = attr.ib()
+    seconds = attr.ib()
+    cycles = attr.ib()
+
+    def to_dict(self):
+        return {
+            "ns": self.seconds / self.instructions * 1e9,
+            "ips": self.instructions / self.seconds,
+            "mhz": self.cycles / self.seconds / 1e6,
+        }
+
+
+def measure(op, count, repeat):
+    best = None
+    for _ in range(repeat):
+        cpu = make_cpu(program(op))
+        step = cpu.step
+        cycles = cpu.cycles
+        start = time.perf_counter()
+        for _ in range(count):
+            step()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best.seconds:
+            best = Result(count, seconds, cpu.cycles - cycles)
+    return best
+
+
+def run(count=20000, repeat=3, only=None):
+    opcodes, modes = {}, {}
+    for op in OPCODES:
+        if op is None or op.mnemonic in SKIP:
+            continue
+        if only and op.mnemonic not in only:
+            continue
+
+        name = op.mnemonic
+        if op.mnemonic in PAIRS:
+            name += "+" + PAIRS[op.mnemonic]
+        result = measure(op, count, repeat)
+        opcodes["{}_{}".format(name, op.mode)] = result.to_dict()
+
+        mode = "{}_{}".format(kind(op), op.mode)
+        total = modes.setdefault(mode, Result(0, 0.0, 0))
+        total.instructions += result.instructions
+        total.seconds += result.seconds
+        total.cycles += result.cycles
+
+    return {
+        "version": 1,
+        "python": platform.python_version(),
+        "count": count,
+        "frequency": FREQUENCY,
+        "opcodes": opcodes,
+        "modes": {name: total.to_dict() for name, total in sorted(modes.items())},
+    }
+
+
+def compare(old, new, threshold):
+    # entries whose ns/instruction grew more than threshold (a fraction)
+    slower = []
+    for group in ("opcodes", "modes"):
+        for name, entry in new[group].items():
+            before = old.get(group, {}).get(name)
+            if before and entry["ns"] > before["ns"] * (1 + threshold):
+                slower.append((name, before["ns"], entry["ns"]))
+    return slower
+
+
+@click.command()
+@click.option("-n", "--count", default=20000, help="Instructions per opcode.")
+@click.option("-r", "--repeat", default=3, help="Runs per opcode, the best is kept.")
+@click.option("-o", "--output", type=click.File("w"), help="Write results as JSON.")
+@click.option("--compare", "baseline", type=click.File("r"), help="Previous results.")
+@click.option("--threshold", default=0.1, help="Slowdown flagged on --compare.")
+@click.argument("mnemonics", nargs=-1)
+def cli(count, repeat, output, baseline, threshold, mnemonics):
+    results = run(count, repeat, set(m.lower() for m in mnemonics))
+
+    click.echo(
+        "{:<16} {:>10} {:>12} {:>8}".format("mode", "ns/instr", "instr/s", "MHz")
+    )
+    for name, entry in results["modes"].items():
+        click.echo(
+            "{:<16} {:>10.1f} {:>12.0f} {:>8.3f}".format(
+                name, entry["ns"], entry["ips"], entry["mhz"]
+            )
+        )
+
+    if output:
+        json.dump(results, output, indent=2, sort_keys=True)
+
+    if baseline:
+        slower = compare(json.load(baseline), results, threshold)
+        for name, before, after in slower:
+            click.echo(
+                "SLOWER {:<16} {:.1f} -> {:.1f} ns/instr".format(name, before, after)
+            )
+        if slower:
+            raise SystemExit(1)
@@ -3,39 +3,143 @@ import logging
 
 log = logging.getLogger(__name__)
 
+PAGE = 0x100
+PAGES = 0x100
+
+
+@attr.s
+class Storage(object):
+    # plain memory behind a handler, used by mirrors smaller than a page
+    memory = attr.ib()
+
+    def read(self, addr):
+        return self.memory[addr]
+
+    def peek(self, addr):
+        return self.memory[addr]
+
+    def write(self, addr, data):
+        self.memory[addr] = data
+
 
 @attr.s
 class BUS(object):
     def __attrs_post_init__(self):
-        self.memory = {}
-        self.mirrors = {}
+        self.memory = bytearray(0x10000)
+        self.view = memoryview(self.memory)
 
-    def mirror(self, addr_range, mirrors):
-        for m in mirrors:
-            for target, origin in zip(range(*m), range(*addr_range)):
-                self.mirrors[target] = origin
-        log.debug("total mirrors: %s", hex(len(self.mirrors)))
+        # page tables: a direct buffer for fast accesses or a handler object
+        # exposing read, peek and write for memory mapped devices
+        self.readable = [None] * PAGES
+        self.writable = [None] * PAGES
+        self.handlers = [None] * PAGES
+        # canonical address of a page access is: base | (addr & mask)
+        self.bases = [0] * PAGES
+        self.masks = [0xFF] * PAGES
 
-    def read(self, addr, return_target=False):
-        addr = self.mirrors.get(addr, addr)
-        return self.memory[addr]
+        self.map(0x0000, 0x10000)
+
+    def map(self, start, end, handler=None, buffer=None, size=None):
+        # maps [start, end) mirroring every size bytes, handler takes the
+        # writes when a buffer is also given (e.g. ROM with mapper registers)
+        size = size or end - start
+        if start & (size - 1) or start % PAGE or end % PAGE:
+            raise ValueError("unaligned region: {:04x}-{:04x}".format(start, end))
+
+        if buffer is None and handler is None:
+            if size < PAGE:
+                handler = Storage(self.memory)
+            else:
+                buffer = self.view[start : start + size]
+        if buffer is not None:
+            buffer = memoryview(buffer)
+
+        for page in range(start >> 8, end >> 8):
+            self.handlers[page] = handler
+            if buffer is None:
+                self.readable[page] = self.writable[page] = None
+                self.bases[page] = start
+                self.masks[page] = size - 1
+                continue
+
+            offset = ((page << 8) - start) % size
+            view = buffer[offset : offset + PAGE]
+            self.readable[page] = view
+            self.writable[page] = view if handler is None else None
+            self.bases[page] = start + offset
+            self.masks[page] = 0xFF
+
+        log.debug("mapped 0x%04x-0x%04x (0x%x)", start, end - 1, size)
+
+    def save_state(self):
+        return bytes(self.memory)
+
+    def load_state(self, data):
+        self.memory[:] = data
+
+    def target(self, addr):
+        page = addr >> 8
+        return self.bases[page] | (addr & self.masks[page])
+
+    def read(self, addr):
+        page = self.readable[addr >> 8]
+        if page is not None:
+            return page[addr & 0xFF]
+        return self.handlers[addr >> 8].read(self.target(addr))
 
     def read_double(self, addr):
-        addr = self.mirrors.get(addr, addr)
-        return (self.memory[addr + 1] << 8) + self.memory[addr]
+        # both bytes in the same buffer page: a single page lookup
+        low = addr & 0xFF
+        if low != 0xFF:
+            page = self.readable[addr >> 8]
+            if page is not None:
+                return page[low] | (page[low + 1] << 8)
+        return (self.read(addr + 1) << 8) + self.read(addr)
 
     def read_target(self, addr):
-        addr = self.mirrors.get(addr, addr)
-        return addr, self.memory[addr]
+        # side effect free read, used when reporting accesses
+        target = self.target(addr)
+        page = self.readable[addr >> 8]
+        if page is not None:
+            return target, page[addr & 0xFF]
+        return target, self.handlers[addr >> 8].peek(target)
 
     def write(self, addr, data):
-        addr = self.mirrors.get(addr, addr)
-        self.memory[addr] = data
-        log.debug("memory size: %s", hex(len(self.memory)))
-        return addr
+        target = self.target(addr)
+        page = self.writable[addr >> 8]
+        if page is not None:
+            page[addr & 0xFF] = data
+        else:
+            self.handlers[addr >> 8].write(target, data)
+        return target
+
+    def write_block(self, block, data):
+        start, end = block
+        data = bytes(data[: end - start])
+        end = start + len(data)
+
+        addr = start
+        while addr < end:
+            chunk = min(end, (addr | 0xFF) + 1) - addr
+            page = self.writable[addr >> 8]
+            offset = addr - start
+            if page is not None:
+                low = addr & 0xFF
+                page[low : low + chunk] = data[offset : offset + chunk]
+            else:
+                for i in range(chunk):
+                    self.write(addr + i, data[offset + i])
+            addr += chunk
+
+
+@attr.s
+class DebugBUS(BUS):
+    # logs every write, the plain BUS has no logging calls at all
+    def write(self, addr, data):
+        target = super().write(addr, data)
+        log.debug("write: 0x%04x = 0x%02x", target, data)
+        return target
 
     def write_block(self, block, data):
-        for addr, value in zip(range(*block), data):
-            addr = self.mirrors.get(addr, addr)
-            self.memory[addr] = value
-        log.debug("memory size: %s", hex(len(self.memory)))
+        super().write_block(block, data)
+        log.debug("write block: 0x%04x-0x%04x", block[0], block[1] - 1)
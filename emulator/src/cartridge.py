@@ -0,0 +1,154 @@
+import attr
+import logging
+import mmap
+
+from .ppu import FOUR_SCREEN, HORIZONTAL, VERTICAL
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"NES\x1a"
+HEADER = 16
+TRAINER = 0x200
+PRG_BANK = 0x4000
+CHR_BANK = 0x2000
+
+# byte 12 of NES 2.0 headers, bit 0 of byte 9 for iNES
+REGIONS = ["NTSC", "PAL", "multi", "Dendy"]
+
+
+class CartridgeError(Exception):
+    pass
+
+
+def rom_size(low, high, unit):
+    # NES 2.0 sizes: a 12 bit count of units, or 2^E * (M*2+1) bytes once the
+    # upper nibble is all set
+    if high == 0x0F:
+        return (1 << (low >> 2)) * ((low & 0x03) * 2 + 1)
+    return ((high << 8) | low) * unit
+
+
+def ram_size(shift):
+    # NES 2.0 RAM sizes are 64 << shift bytes, 0 means none
+    return 64 << shift if shift else 0
+
+
+def bank(view, index, size):
+    # bank index of size bytes, wrapping around like the address lines
+    count = max(1, len(view) // size)
+    start = (index % count) * size
+    return view[start : start + size]
+
+
+@attr.s
+class Cartridge(object):
+    # parsed iNES or NES 2.0 image, prg, chr and trainer are memoryviews over
+    # the image so banks can be handed out without copying
+    data = attr.ib(repr=False)
+    nes2 = attr.ib()
+    mapper = attr.ib()
+    submapper = attr.ib()
+    mirroring = attr.ib()
+    battery = attr.ib()
+    console = attr.ib()
+    region = attr.ib()
+    prg_ram = attr.ib()
+    chr_ram = attr.ib()
+    trainer = attr.ib(repr=False)
+    prg = attr.ib(repr=False)
+    chr = attr.ib(repr=False)
+
+    @classmethod
+    def parse(cls, data):
+        data = memoryview(data).cast("B")
+        header = bytes(data[:HEADER])
+        if len(header) < HEADER or header[:4] != MAGIC:
+            raise CartridgeError("not an iNES image")
+
+        flags6, flags7 = header[6], header[7]
+        nes2 = flags7 & 0x0C == 0x08
+        mapper = (flags6 >> 4) | (flags7 & 0xF0)
+        if nes2:
+            mapper |= (header[8] & 0x0F) << 8
+            submapper = header[8] >> 4
+            prg_size = rom_size(header[4], header[9] & 0x0F, PRG_BANK)
+            chr_size = rom_size(header[5], header[9] >> 4, CHR_BANK)
+            prg_ram = ram_size(header[10] & 0x0F) + ram_size(header[10] >> 4)
+            chr_ram = ram_size(header[11] & 0x0F) + ram_size(header[11] >> 4)
+            region = REGIONS[header[12] & 0x03]
+        else:
+            # old dumps have garbage in bytes 7-15, e.g. "DiskDude!"
+            if any(header[12:]):
+                mapper &= 0x0F
+            submapper = 0
+            prg_size = header[4] * PRG_BANK
+            chr_size = header[5] * CHR_BANK
+            prg_ram = (header[8] or 1) * 0x2000
+            chr_ram = 0 if chr_size else CHR_BANK
+            region = REGIONS[header[9] & 0x01]
+
+        if flags6 & 0x08:
+            mirroring = FOUR_SCREEN
+        else:
+            mirroring = VERTICAL if flags6 & 0x01 else HORIZONTAL
+
+        offset = HEADER
+        trainer = None
+        if flags6 & 0x04:
+            trainer = data[offset : offset + TRAINER]
+            offset += TRAINER
+        if not prg_size:
+            raise CartridgeError("no PRG ROM")
+        if len(data) < offset + prg_size:
+            raise CartridgeError(
+                "PRG ROM truncated: {} of {} bytes".format(len(data) - offset, prg_size)
+            )
+        prg = data[offset : offset + prg_size]
+        offset += prg_size
+
+        # assemblers often leave the CHR count of a template header behind,
+        # the CHR present is used and the rest treated as missing
+        chr = data[offset : offset + chr_size]
+        if len(chr) < chr_size:
+            log.info("CHR ROM truncated: %d of %d bytes", len(chr), chr_size)
+            if not len(chr):
+                chr_ram = chr_ram or CHR_BANK
+        if len(chr) % CHR_BANK:
+            # the PPU sees whole 8KB banks, the missing bytes read as 0
+            padded = bytearray(-(-len(chr) // CHR_BANK) * CHR_BANK)
+            padded[: len(chr)] = chr
+            chr = memoryview(padded).toreadonly()
+
+        cartridge = cls(
+            data,
+            nes2,
+            mapper,
+            submapper,
+            mirroring,
+            bool(flags6 & 0x02),
+            flags7 & 0x03,
+            region,
+            prg_ram,
+            chr_ram,
+            trainer,
+            prg,
+            chr,
+        )
+        log.debug("%s", cartridge)
+        return cartridge
+
+    @classmethod
+    def open(cls, path):
+        # the file is mapped read only, the mapping lives as long as a view
+        with open(path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise CartridgeError("empty file: {}".format(path))
+        return cls.parse(data)
+
+    def prg_bank(self, index, size=PRG_BANK):
+        return bank(self.prg, index, size)
+
+    def chr_bank(self, index, size=CHR_BANK):
+        return bank(self.chr, index, size)
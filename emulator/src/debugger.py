@@ -0,0 +1,259 @@
+import attr
+import click
+import cmd
+import itertools
+import signal
+
+from .cpu import IllegalOpcode
+from .opcodes import OPCODES, disassemble
+
+# names usable in conditions, mem(addr) reads memory without side effects
+NAMES = {"pc", "a", "x", "y", "sp", "p", "cycles", "mem"}
+
+
+class DebuggerError(Exception):
+    pass
+
+
+def registers(cpu):
+    return {
+        "pc": cpu.pc,
+        "a": cpu.a,
+        "x": cpu.x,
+        "y": cpu.y,
+        "sp": cpu.sp,
+        "p": cpu.status,
+        "cycles": cpu.cycles,
+        "mem": lambda addr: cpu.bus.read_target(addr & 0xFFFF)[1],
+    }
+
+
+def opcodes(spec):
+    # an opcode byte, e.g. 0x6C, or a mnemonic standing for all its opcodes
+    try:
+        return frozenset([int(spec, 0) & 0xFF])
+    except ValueError:
+        codes = {op.code for op in OPCODES if op and op.mnemonic == spec.lower()}
+        if not codes:
+            raise DebuggerError("unknown opcode: {}".format(spec))
+        return frozenset(codes)
+
+
+@attr.s
+class Breakpoint(object):
+    # matches when all of the given pc, opcodes and condition do; a condition
+    # on its own is a watch, which breaks when it becomes true
+    number = attr.ib()
+    pc = attr.ib(default=None)
+    opcodes = attr.ib(default=None)
+    condition = attr.ib(default=None)
+
+    def __attrs_post_init__(self):
+        self.code = None
+        if self.condition is not None:
+            try:
+                self.code = compile(self.condition, "<condition>", "eval")
+            except SyntaxError as e:
+                raise DebuggerError("invalid condition: {}".format(e.msg))
+            unknown = set(self.code.co_names) - NAMES
+            if unknown:
+                raise DebuggerError("unknown names: {}".format(", ".join(unknown)))
+        self.last = False
+
+    def watch(self):
+        return self.pc is None and self.opcodes is None
+
+    def matches(self, cpu):
+        if self.pc is not None and cpu.pc != self.pc:
+            return False
+        if self.opcodes is not None:
+            if cpu.bus.read_target(cpu.pc)[1] not in self.opcodes:
+                return False
+        if self.code is None:
+            return True
+        value = bool(eval(self.code, {}, registers(cpu)))
+        if self.watch():
+            value, self.last = value and not self.last, value
+        return value
+
+    def describe(self):
+        parts = []
+        if self.pc is not None:
+            parts.append("pc 0x{:04x}".format(self.pc))
+        if self.opcodes is not None:
+            codes = ", ".join("0x{:02x}".format(code) for code in sorted(self.opcodes))
+            parts.append("opcode " + codes)
+        if self.condition is not None:
+            parts.append(("watch " if self.watch() else "if ") + self.condition)
+        return "#{} {}".format(self.number, " ".join(parts))
+
+
+@attr.s
+class Debugger(object):
+    # breakpoints and stepping on top of NES.run, which only switches to its
+    # instrumented loop while there are breakpoints
+    nes = attr.ib()
+
+    def __attrs_post_init__(self):
+        self.breakpoints = []
+        self.numbers = itertools.count(1)
+        self.hit = None
+        self.stopped = None
+        self.nes.debugger = self
+        self.update()
+
+    def add(self, pc=None, opcodes=None, condition=None):
+        breakpoint = Breakpoint(next(self.numbers), pc, opcodes, condition)
+        self.breakpoints.append(breakpoint)
+        self.update()
+        return breakpoint
+
+    def remove(self, number):
+        count = len(self.breakpoints)
+        self.breakpoints = [b for b in self.breakpoints if b.number != number]
+        if len(self.breakpoints) == count:
+            raise DebuggerError("no breakpoint #{}".format(number))
+        self.update()
+
+    def clear(self):
+        self.breakpoints = []
+        self.update()
+
+    def update(self):
+        # pcs to look at and whether anything needs a look at every pc
+        self.pcs = {b.pc for b in self.breakpoints if b.pc is not None}
+        self.everywhere = any(b.pc is None for b in self.breakpoints)
+
+    def armed(self):
+        return bool(self.breakpoints)
+
+    def check(self, cpu):
+        # called by the run loop, stops it when a breakpoint matches
+        for breakpoint in self.breakpoints:
+            if breakpoint.matches(cpu):
+                self.hit, self.stopped = breakpoint, cpu.pc
+                return True
+        return False
+
+    def start(self, cpu):
+        # called as a run starts, a breakpoint at cpu.pc stops it before the
+        # first instruction unless the run resumes from a stop there
+        resumed = self.hit is not None and self.stopped == cpu.pc
+        self.hit = None
+        if resumed or not (self.everywhere or cpu.pc in self.pcs):
+            return False
+        return self.check(cpu)
+
+    def step(self, count=1):
+        return self.nes.run(max_instructions=count)
+
+    def resume(self, **limits):
+        return self.nes.run(**limits)
+
+
+class Console(cmd.Cmd):
+    # REPL around a Debugger, addresses and numbers take any python prefix
+    prompt = "(nes) "
+
+    def __init__(self, debugger, **kwargs):
+        super().__init__(**kwargs)
+        self.debugger = debugger
+        self.cpu = debugger.nes.cpu
+
+    def preloop(self):
+        click.echo("Debugger, type help or ? to list the commands.")
+        self.do_regs("")
+
+    def onecmd(self, line):
+        try:
+            return super().onecmd(line)
+        except (DebuggerError, IllegalOpcode, IndexError, ValueError) as e:
+            click.echo("error: {}".format(e))
+
+    def emptyline(self):
+        pass
+
+    def do_break(self, arg):
+        """break ADDRESS [if CONDITION]: stop before running ADDRESS, continuing
+        from a stop there runs it"""
+        address, _, condition = arg.partition(" if ")
+        breakpoint = self.debugger.add(int(address, 0), condition=condition or None)
+        click.echo(breakpoint.describe())
+
+    def do_opcode(self, arg):
+        """opcode OPCODE|MNEMONIC [if CONDITION]: stop before running it"""
+        spec, _, condition = arg.partition(" if ")
+        breakpoint = self.debugger.add(None, opcodes(spec), condition or None)
+        click.echo(breakpoint.describe())
+
+    def do_watch(self, arg):
+        """watch CONDITION: stop once CONDITION becomes true, e.g. x == 3"""
+        click.echo(self.debugger.add(condition=arg).describe())
+
+    def do_delete(self, arg):
+        """delete [NUMBER]: delete a breakpoint or all of them"""
+        if arg:
+            self.debugger.remove(int(arg, 0))
+        else:
+            self.debugger.clear()
+
+    def do_list(self, arg):
+        """list: show the breakpoints"""
+        for breakpoint in self.debugger.breakpoints:
+            click.echo(breakpoint.describe())
+
+    def do_step(self, arg):
+        """step [COUNT]: run COUNT instructions"""
+        self.__report(self.__run(self.debugger.step, int(arg, 0) if arg else 1))
+
+    def do_continue(self, arg):
+        """continue: run until a breakpoint, the program halts or Ctrl-C"""
+        self.__report(self.__run(self.debugger.resume))
+
+    def do_regs(self, arg):
+        """regs: show the registers and the next instruction"""
+        cpu = self.cpu
+        click.echo(
+            "pc=0x{:04x} a=0x{:02x} x=0x{:02x} y=0x{:02x} sp=0x{:04x} "
+            "p={:08b} cycles={}".format(
+                cpu.pc, cpu.a, cpu.x, cpu.y, cpu.sp, cpu.status, cpu.cycles
+            )
+        )
+        click.echo("0x{:04x}: {}".format(cpu.pc, disassemble(self.__read, cpu.pc)))
+
+    def do_mem(self, arg):
+        """mem ADDRESS [COUNT]: show COUNT bytes from ADDRESS"""
+        args = arg.split()
+        start = int(args[0], 0)
+        count = int(args[1], 0) if len(args) > 1 else 16
+        for row in range(start, start + count, 16):
+            values = [self.__read(a) for a in range(row, min(row + 16, start + count))]
+            click.echo(
+                "0x{:04x}: {}".format(row, " ".join("{:02x}".format(v) for v in values))
+            )
+
+    def do_quit(self, arg):
+        """quit: leave the debugger"""
+        return True
+
+    do_b, do_c, do_s, do_q = do_break, do_continue, do_step, do_quit
+    do_EOF = do_quit
+
+    def __read(self, addr):
+        return self.cpu.bus.read_target(addr & 0xFFFF)[1]
+
+    def __run(self, run, *args):
+        # Ctrl-C stops the run between two instructions, back at the prompt
+        scheduler = self.debugger.nes.scheduler
+        handler = signal.signal(signal.SIGINT, lambda *_: scheduler.stop("interrupted"))
+        try:
+            return run(*args)
+        finally:
+            signal.signal(signal.SIGINT, handler)
+
+    def __report(self, result):
+        if result.reason == "break":
+            click.echo("breakpoint {}".format(self.debugger.hit.describe()))
+        elif result.reason != "instructions":
+            click.echo("stopped: {}".format(result.reason))
+        self.do_regs("")
@@ -0,0 +1,234 @@
+import attr
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# bits of the controller state, in the order they are shifted out
+BUTTONS = ["a", "b", "select", "start", "up", "down", "left", "right"]
+MASKS = {name: 1 << bit for bit, name in enumerate(BUTTONS)}
+
+
+class InputError(Exception):
+    pass
+
+
+def buttons(names):
+    # state of a list of button names, e.g. ["a", "right"]
+    state = 0
+    for name in names:
+        state |= MASKS[name.lower()]
+    return state
+
+
+def parse_script(text):
+    # one "frame buttons" entry per line, buttons joined by + and - for none:
+    #   120 start
+    #   180 a+right
+    #   200 -
+    script = []
+    for line in text.splitlines():
+        line = line.split("#")[0].strip()
+        if not line:
+            continue
+        frame, names = line.split()
+        names = [] if names == "-" else names.split("+")
+        script.append((int(frame), buttons(names)))
+    return sorted(script)
+
+
+@attr.s
+class NullInput(object):
+    # sources publish the buttons held as an 8 bit int in state, which is
+    # replaced as a whole so the emulator always reads a consistent snapshot
+    state = attr.ib(default=0, kw_only=True)
+
+    def start(self):
+        pass
+
+    def frame(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+@attr.s
+class ScriptedInput(NullInput):
+    # deterministic input: the state changes on the given frames
+    script = attr.ib(factory=list)
+
+    def __attrs_post_init__(self):
+        self.frames = 0
+        self.index = 0
+        self.frame()
+
+    def frame(self):
+        # called by the emulator once per frame
+        while self.index < len(self.script):
+            frame, state = self.script[self.index]
+            if frame > self.frames:
+                break
+            self.state = state
+            self.index += 1
+        self.frames += 1
+
+
+@attr.s
+class KeyboardInput(NullInput):
+    # pynput runs the listener in its own thread
+    keys = attr.ib(
+        factory=lambda: {
+            "z": "a",
+            "x": "b",
+            "Key.shift_r": "select",
+            "Key.enter": "start",
+            "Key.up": "up",
+            "Key.down": "down",
+            "Key.left": "left",
+            "Key.right": "right",
+        }
+    )
+
+    def start(self):
+        try:
+            from pynput import keyboard
+        except ImportError as e:
+            raise InputError("keyboard input needs pynput ({})".format(e))
+
+        self.listener = keyboard.Listener(on_press=self.press, on_release=self.release)
+        self.listener.start()
+
+    def press(self, key):
+        mask = self.__mask(key)
+        self.state = self.state | mask
+
+    def release(self, key):
+        mask = self.__mask(key)
+        self.state = self.state & ~mask
+
+    def stop(self):
+        self.listener.stop()
+
+    def __mask(self, key):
+        name = getattr(key, "char", None) or str(key)
+        return MASKS.get(self.keys.get(name), 0)
+
+
+@attr.s
+class GamepadInput(NullInput):
+    # evdev gamepad read on a daemon thread, the first one found by default
+    path = attr.ib(default=None)
+    keys = attr.ib(
+        factory=lambda: {
+            "BTN_SOUTH": "a",
+            "BTN_EAST": "b",
+            "BTN_SELECT": "select",
+            "BTN_START": "start",
+        }
+    )
+
+    def start(self):
+        try:
+            import evdev
+        except ImportError as e:
+            raise InputError("gamepad input needs evdev ({})".format(e))
+
+        self.evdev = evdev
+        devices = evdev.list_devices()
+        if self.path is None and not devices:
+            raise InputError("no gamepad found")
+        path = self.path or devices[0]
+        try:
+            self.device = evdev.InputDevice(path)
+        except OSError as e:
+            raise InputError("cannot open gamepad {}: {}".format(path, e.strerror))
+        log.info("gamepad: %s", self.device)
+        self.thread = threading.Thread(target=self.__read, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.device.close()
+
+    def __read(self):
+        ecodes = self.evdev.ecodes
+        try:
+            for event in self.device.read_loop():
+                if event.type == ecodes.EV_KEY:
+                    names = ecodes.BTN.get(event.code, ())
+                    names = [names] if isinstance(names, str) else names
+                    for name in names:
+                        self.__set(self.keys.get(name), event.value)
+                elif event.type == ecodes.EV_ABS:
+                    self.__axis(ecodes.ABS.get(event.code), event.value)
+        except OSError:
+            log.debug("gamepad closed")
+
+    def __axis(self, name, value):
+        # d-pad as a hat: -1, 0 or 1 on each axis
+        if name == "ABS_HAT0X":
+            self.__set("left", value < 0)
+            self.__set("right", value > 0)
+        elif name == "ABS_HAT0Y":
+            self.__set("up", value < 0)
+            self.__set("down", value > 0)
+
+    def __set(self, name, pressed):
+        mask = MASKS.get(name, 0)
+        self.state = (self.state | mask) if pressed else (self.state & ~mask)
+
+
+@attr.s
+class Joypad(object):
+    # standard controller: the state is latched while strobe is high and
+    # shifted out one bit per read, reads after the 8th return 1
+    source = attr.ib(factory=NullInput)
+    strobe = attr.ib(default=0, init=False)
+    shift = attr.ib(default=0, init=False)
+
+    def write(self, data):
+        self.strobe = data & 1
+        if self.strobe:
+            self.shift = self.source.state
+
+    def read(self):
+        if self.strobe:
+            self.shift = self.source.state
+            return self.shift & 1
+        bit = self.shift & 1
+        self.shift = (self.shift >> 1) | 0x80
+        return bit
+
+    def peek(self):
+        if self.strobe:
+            return self.source.state & 1
+        return self.shift & 1
+
+
+@attr.s
+class Ports(object):
+    # $4016 and $4017, the upper bits read back the open bus
+    one = attr.ib(factory=Joypad)
+    two = attr.ib(factory=Joypad)
+
+    def read(self, addr):
+        return 0x40 | (self.one if addr == 0x4016 else self.two).read()
+
+    def peek(self, addr):
+        return 0x40 | (self.one if addr == 0x4016 else self.two).peek()
+
+    def write(self, data):
+        self.one.write(data)
+        self.two.write(data)
+
+    def start(self):
+        self.one.source.start()
+        self.two.source.start()
+
+    def frame(self):
+        self.one.source.frame()
+        self.two.source.frame()
+
+    def stop(self):
+        self.one.source.stop()
+        self.two.source.stop()
@@ -1,18 +1,108 @@
 import click
 import logging
 
-from .bus import BUS
-from .cpu import CPU
+from .apu import APU
+from .audio import NullAudio, PygameAudio, SoundDeviceAudio
+from .bus import BUS, DebugBUS
+from .cartridge import Cartridge, CartridgeError
+from .cpu import CPU, DebugCPU
+from .debugger import Console, Debugger
+from .joypad import (
+    GamepadInput,
+    InputError,
+    Joypad,
+    KeyboardInput,
+    NullInput,
+    Ports,
+    ScriptedInput,
+    parse_script,
+)
 from .nes import NES
-
+from .ppu import PPU
+from .profiler import Profiler
+from .trace import ThreadedTrace
 
 log = logging.getLogger(__name__)
 
 
+def address(ctx, param, value):
+    # accepts decimal or prefixed values, e.g. 0xC000
+    if value is None:
+        return None
+    try:
+        return int(value, 0)
+    except ValueError:
+        raise click.BadParameter("not an address: {}".format(value))
+
+
 @click.command()
-@click.argument("filename", type=click.File("rb"))
+@click.argument("filename", type=click.Path(exists=True, dir_okay=False))
 @click.option("-v", "--verbose", count=True, help="Increase verbosity.")
-def cli(filename, verbose):
+@click.option(
+    "--trace/--no-trace", default=True, help="Print CPU status per instruction."
+)
+@click.option(
+    "--trace-file", type=click.File("w"), help="Write the trace to a file instead."
+)
+@click.option("--profile", is_flag=True, help="Report time spent per opcode.")
+@click.option(
+    "--profile-output", type=click.File("w"), help="Write the profile as JSON."
+)
+@click.option(
+    "--display",
+    type=click.Choice(["none", "pygame"]),
+    default="none",
+    help="Window to show the frames in.",
+)
+@click.option("--scale", default=2, help="Window size as a multiple of 256x240.")
+@click.option(
+    "--audio",
+    type=click.Choice(["none", "pygame", "sounddevice"]),
+    default="none",
+    help="Device to play the sound on.",
+)
+@click.option(
+    "--input",
+    "source",
+    type=click.Choice(["none", "keyboard", "gamepad"]),
+    default="none",
+    help="Controller 1 input.",
+)
+@click.option("--gamepad", help="evdev device of the gamepad, e.g. /dev/input/event3.")
+@click.option(
+    "--input-script",
+    type=click.File("r"),
+    help='Controller 1 script: "frame buttons" per line, e.g. "120 a+right".',
+)
+@click.option("--max-instructions", type=int, help="Stop after this many instructions.")
+@click.option("--max-cycles", type=int, help="Stop after this many CPU cycles.")
+@click.option("--max-frames", type=int, help="Stop after this many frames.")
+@click.option("--stop-pc", callback=address, help="Stop when reaching this address.")
+@click.option(
+    "--debug",
+    "debugging",
+    is_flag=True,
+    help="Run in the interactive debugger, without the trace.",
+)
+def cli(
+    filename,
+    verbose,
+    trace,
+    trace_file,
+    profile,
+    profile_output,
+    display,
+    scale,
+    audio,
+    source,
+    gamepad,
+    input_script,
+    max_instructions,
+    max_cycles,
+    max_frames,
+    stop_pc,
+    debugging,
+):
     level = logging.WARNING - 10 * verbose
     logging.basicConfig(
         format="%(levelname)-10s - %(name)-20s - %(message)s", level=level
@@ -20,11 +110,60 @@ def cli(filename, verbose):
     log.info("Started")
 
     log.debug("Loading cartridge")
-    data = filename.read()
+    try:
+        cartridge = Cartridge.open(filename)
+    except CartridgeError as e:
+        raise click.BadParameter(str(e), param_hint="FILENAME")
+
+    # input starts first, nothing else is open yet if there is no device
+    if input_script:
+        source = ScriptedInput(parse_script(input_script.read()))
+    elif source == "keyboard":
+        source = KeyboardInput()
+    elif source == "gamepad":
+        source = GamepadInput(gamepad)
+    else:
+        source = NullInput()
+    ports = Ports(Joypad(source))
+    try:
+        ports.start()
+    except InputError as e:
+        raise click.BadParameter(str(e), param_hint=["--input", "--gamepad"])
+
+    # instruction level logging is only installed with -vv
+    debug = verbose >= 2
+    bus = DebugBUS() if debug else BUS()
+    ppu = PPU()
+    cpu = DebugCPU() if debug else CPU()
+    sink = None
+    if trace and not debugging:
+        sink = ThreadedTrace(trace_file)
+    profiler = Profiler() if profile or profile_output else None
+    screen = None
+    if display == "pygame":
+        # pygame is only imported when a window is requested
+        from .screen import Screen
 
-    bus = BUS()
-    ppu = None
-    cpu = CPU()
-    nes = NES(cpu, ppu, bus)
+        screen = Screen(scale)
+        screen.open()
+    sound = {"pygame": PygameAudio, "sounddevice": SoundDeviceAudio}
+    sound = sound.get(audio, NullAudio)()
+    sound.open()
+    nes = NES(cpu, ppu, bus, sink, profiler, screen, APU(), sound, ports)
 
-    nes.run(data)
+    try:
+        if debugging:
+            nes.insert(cartridge)
+            Console(Debugger(nes)).cmdloop()
+        else:
+            nes.run(cartridge, max_instructions, max_cycles, max_frames, stop_pc)
+    finally:
+        nes.close()
+        ports.stop()
+        sound.close()
+        if screen:
+            screen.close()
+        if profile_output:
+            profiler.dump(profile_output)
+        elif profiler:
+            click.echo(profiler.report(), err=True)
@@ -0,0 +1,168 @@
+import attr
+import logging
+
+from .ppu import HORIZONTAL, SINGLE_LOWER, SINGLE_UPPER, VERTICAL
+
+log = logging.getLogger(__name__)
+
+
+class MapperError(Exception):
+    pass
+
+
+@attr.s
+class Mapper(object):
+    # cartridge board: PRG banks are mapped into the bus page tables as views
+    # of the ROM and CHR banks are selected in the PPU, so switching a bank
+    # only re-points tables; writes to $8000-$FFFF reach write
+    prg = attr.ib(repr=False)
+    # power on values of the registers, which are all the state there is
+    power = b""
+
+    def setup(self, bus, ppu=None, invalidate=None):
+        # invalidate(start, end) drops the instructions decoded from a range
+        self.bus, self.ppu, self.invalidate = bus, ppu, invalidate
+        self.registers = bytearray(self.power)
+        self.mapped = {}
+        self.apply()
+
+    def write(self, addr, data):
+        pass
+
+    def apply(self):
+        # maps the banks selected by the registers
+        pass
+
+    def save_state(self):
+        return bytes(self.registers)
+
+    def load_state(self, data):
+        self.registers[:] = data
+        self.mapped = {}
+        self.apply()
+
+    def map_prg(self, start, size, bank):
+        # bank of size bytes at start, the bank number wraps around; mapping
+        # the bank already there costs nothing
+        count = max(1, len(self.prg) // size)
+        offset = (bank % count) * size
+        if self.mapped.get(start) == (size, offset):
+            return
+        end = start + size
+        for other, (other_size, _) in list(self.mapped.items()):
+            if other < end and start < other + other_size:
+                del self.mapped[other]
+        self.mapped[start] = size, offset
+
+        # a ROM shorter than the window repeats, each copy mapped on its own so
+        # register writes see the CPU address and not the first copy
+        view = self.prg[offset : offset + size]
+        for base in range(start, end, len(view)):
+            self.bus.map(base, base + len(view), handler=self, buffer=view)
+        if self.invalidate is not None:
+            self.invalidate(start, end)
+
+    def map_chr(self, table, bank):
+        # 4KB CHR bank shown as pattern table 0 or 1
+        if self.ppu is not None:
+            self.ppu.switch_chr(table, bank)
+
+    def mirror(self, mirroring):
+        if self.ppu is not None:
+            self.ppu.mirroring = mirroring
+
+
+@attr.s
+class NROM(Mapper):
+    # mapper 0, no registers: PRG is copied into the bus memory once, which
+    # keeps $8000-$FFFF writable as the test programs expect
+    def setup(self, bus, ppu=None, invalidate=None):
+        super().setup(bus, ppu, invalidate)
+        size = min(len(self.prg), 0x8000)
+        bus.map(0x8000, 0x10000, size=size)
+        bus.write_block((0x8000, 0x8000 + size), self.prg)
+
+
+@attr.s
+class MMC1(Mapper):
+    # mapper 1, registers are written one bit at a time through a shift
+    # register: shift (with a marker bit), control, chr0, chr1 and prg
+    power = bytes([0x10, 0x0C, 0x00, 0x00, 0x00])
+    MIRRORING = [SINGLE_LOWER, SINGLE_UPPER, VERTICAL, HORIZONTAL]
+
+    def write(self, addr, data):
+        registers = self.registers
+        if data & 0x80:
+            registers[0] = 0x10
+            registers[1] |= 0x0C
+        else:
+            # the fifth write finds the marker at bit 0
+            full = registers[0] & 1
+            registers[0] = (registers[0] >> 1) | ((data & 1) << 4)
+            if not full:
+                return
+            registers[1 + ((addr >> 13) & 0x03)] = registers[0]
+            registers[0] = 0x10
+        self.apply()
+
+    def apply(self):
+        _, control, chr0, chr1, prg = self.registers
+        self.mirror(self.MIRRORING[control & 0x03])
+
+        mode, bank = (control >> 2) & 0x03, prg & 0x0F
+        if mode < 2:
+            self.map_prg(0x8000, 0x8000, bank >> 1)
+        elif mode == 2:
+            self.map_prg(0x8000, 0x4000, 0)
+            self.map_prg(0xC000, 0x4000, bank)
+        else:
+            self.map_prg(0x8000, 0x4000, bank)
+            self.map_prg(0xC000, 0x4000, -1)
+
+        if control & 0x10:
+            self.map_chr(0, chr0)
+            self.map_chr(1, chr1)
+        else:
+            self.map_chr(0, chr0 & 0x1E)
+            self.map_chr(1, chr0 | 0x01)
+
+
+@attr.s
+class UxROM(Mapper):
+    # mapper 2, 16KB bank at $8000 selected by any write, the last bank is
+    # fixed at $C000
+    power = b"\x00"
+
+    def write(self, addr, data):
+        self.registers[0] = data
+        self.apply()
+
+    def apply(self):
+        self.map_prg(0x8000, 0x4000, self.registers[0])
+        self.map_prg(0xC000, 0x4000, -1)
+
+
+@attr.s
+class CNROM(Mapper):
+    # mapper 3, fixed PRG and an 8KB CHR bank selected by any write
+    power = b"\x00"
+
+    def write(self, addr, data):
+        self.registers[0] = data
+        self.apply()
+
+    def apply(self):
+        self.map_prg(0x8000, 0x8000, 0)
+        self.map_chr(0, self.registers[0] << 1)
+        self.map_chr(1, (self.registers[0] << 1) | 0x01)
+
+
+MAPPERS = {0: NROM, 1: MMC1, 2: UxROM, 3: CNROM}
+
+
+def create(cartridge):
+    if cartridge.mapper not in MAPPERS:
+        raise MapperError("unsupported mapper: {}".format(cartridge.mapper))
+    mapper = MAPPERS[cartridge.mapper](cartridge.prg)
+    log.debug("%s", mapper)
+    return mapper
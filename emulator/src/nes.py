@@ -1,18 +1,34 @@
 import attr
 import logging
+import sys
+import time
+
+from . import mappers, state
+from .cartridge import Cartridge
+from .ppu import CYCLES_PER_FRAME
+from .scheduler import Scheduler
 
 log = logging.getLogger(__name__)
 
+# save state chunks and the components they belong to
+STATE_CHUNKS = [
+    (b"CPU ", "cpu"),
+    (b"BUS ", "bus"),
+    (b"PPU ", "ppu"),
+    (b"APU ", "apu"),
+    (b"MAPR", "mapper"),
+]
+
 
-def load(data):
-    header = data[:16]
-    banks = header[4]
-    vbanks = header[5]
-    prg_end = 0x4000 * banks + 16
-    chr_end = 0x2000 * vbanks + prg_end
-    prg_rom = data[16:prg_end]
-    chr_rom = data[prg_end:chr_end]
-    return header, prg_rom, chr_rom
+@attr.s
+class RunResult(object):
+    # reason is one of: closed, halt, instructions, cycles, frames, pc, break or
+    # interrupted
+    reason = attr.ib()
+    instructions = attr.ib()
+    cycles = attr.ib()
+    frames = attr.ib()
+    elapsed = attr.ib()
 
 
 @attr.s
@@ -20,22 +36,199 @@ class NES(object):
     cpu = attr.ib()
     ppu = attr.ib()
     bus = attr.ib()
+    trace = attr.ib(default=None)
+    profiler = attr.ib(default=None)
+    display = attr.ib(default=None)
+    apu = attr.ib(default=None)
+    audio = attr.ib(default=None)
+    ports = attr.ib(default=None)
+    debugger = attr.ib(default=None)
+    cartridge = attr.ib(default=None, init=False, repr=False)
+    mapper = attr.ib(default=None, init=False, repr=False)
+    scheduler = attr.ib(factory=Scheduler, init=False, repr=False)
 
-    def run(self, data):
+    def insert(self, cartridge):
+        # takes a Cartridge or the bytes of an iNES image
+        if not isinstance(cartridge, Cartridge):
+            cartridge = Cartridge.parse(cartridge)
+        self.cartridge = cartridge
+        log.debug("PRG size: %d", len(cartridge.prg))
+        log.debug("CHR size: %d", len(cartridge.chr))
+
+        self.scheduler = Scheduler()
+        self.cpu.setup(self.bus)
+        if self.ppu is not None:
+            self.ppu.setup(self.bus, cartridge.chr, cartridge.mirroring)
+            self.ppu.attach(self.scheduler, self.cpu.nmi, self.__frame)
+        self.mapper = mappers.create(cartridge)
+        self.mapper.setup(self.bus, self.ppu, self.cpu.invalidate)
+        if self.apu is not None:
+            output = None
+            if self.audio is not None:
+                output, self.apu.rate = self.audio.write, self.audio.rate
+            self.apu.setup(
+                self.bus,
+                self.scheduler,
+                self.__clock,
+                self.cpu.irq,
+                self.__dma,
+                output,
+                self.ports,
+            )
+        # the reset vector is read once the PRG banks are in place
+        self.cpu.reset()
+
+    def run(
+        self,
+        cartridge=None,
+        max_instructions=None,
+        max_cycles=None,
+        max_frames=None,
+        stop_pc=None,
+    ):
+        # runs until BRK or one of the limits, resumes when no cartridge is
+        # given
         log.info("Running...")
+        if cartridge is not None:
+            self.insert(cartridge)
+
+        cpu, scheduler = self.cpu, self.scheduler
+        cpu.halted = False
+        start = cpu.cycles
+        if max_instructions is None:
+            max_instructions = sys.maxsize
+
+        # budgets are events too, so the loop has a single deadline to check
+        limits = []
+        if max_cycles is not None:
+            limits.append((start + max_cycles, "cycles"))
+        if max_frames is not None:
+            limits.append((start + max_frames * CYCLES_PER_FRAME, "frames"))
+        limits = [
+            scheduler.schedule(cycle, lambda _, reason=reason: scheduler.stop(reason))
+            for cycle, reason in limits
+        ]
+
+        step = cpu.step
+        if self.profiler is not None:
+            step = self.profiler.wrap(cpu, step)
+        if self.trace is not None:
+            step = self.__traced(step)
+
+        # breakpoints swap in an instrumented loop, without them the plain
+        # loop runs untouched
+        loop = self.__loop
+        if self.debugger is not None:
+            if self.debugger.armed():
+                loop = self.__debugged
+            else:
+                self.debugger.hit = None
+
+        began = time.perf_counter()
+        try:
+            count = loop(step, max_instructions, stop_pc)
+        finally:
+            for event in limits:
+                scheduler.cancel(event)
+            # runs resume, the sink is only closed with the emulator
+            if self.trace is not None:
+                self.trace.flush()
+        elapsed = time.perf_counter() - began
+
+        cycles = cpu.cycles - start
+        reason = scheduler.resume()
+        if reason is None:
+            if cpu.halted:
+                reason = "halt"
+            elif cpu.pc == stop_pc:
+                reason = "pc"
+            elif self.debugger is not None and self.debugger.hit is not None:
+                reason = "break"
+            else:
+                reason = "instructions"
 
-        header, prg_rom, chr_rom = load(data)
-        log.debug("Cartridge size: %d", len(data))
-        log.debug("Header size: %d", len(header))
-        log.debug("PRG size: %d", len(prg_rom))
-        log.debug("CHR size: %d", len(chr_rom))
+        result = RunResult(reason, count, cycles, cycles // CYCLES_PER_FRAME, elapsed)
+        log.info("Stopped: %s", result)
+        return result
 
-        self.cpu.setup(self.bus, prg_rom)
+    def close(self):
+        # ends the session, after the last run
+        if self.trace is not None:
+            self.trace.close()
 
-        while True:
-            try:
-                self.cpu.step()
-            except Exception as e:
-                if str(e) != "brk":
-                    raise e
+    def save_state(self):
+        chunks = []
+        for tag, name in STATE_CHUNKS:
+            component = getattr(self, name)
+            if component is not None:
+                chunks.append((tag, component.save_state()))
+        return state.pack(chunks)
+
+    def load_state(self, blob):
+        chunks = state.unpack(blob)
+        for tag, name in STATE_CHUNKS:
+            component = getattr(self, name)
+            if component is None:
+                continue
+            if tag not in chunks:
+                raise state.StateError("missing {} state".format(name))
+            component.load_state(chunks[tag])
+
+    def __loop(self, step, max_instructions, stop_pc):
+        cpu, scheduler = self.cpu, self.scheduler
+        count = 0
+        for count in range(1, max_instructions + 1):
+            step()
+            if cpu.cycles >= scheduler.deadline:
+                if scheduler.run(cpu.cycles) is None:
+                    break
+            if cpu.halted or cpu.pc == stop_pc:
+                break
+        return count
+
+    def __debugged(self, step, max_instructions, stop_pc):
+        # breaks before the instruction at cpu.pc runs; only pc breakpoints
+        # set: a single set lookup per instruction
+        cpu, scheduler, debugger = self.cpu, self.scheduler, self.debugger
+        pcs, everywhere, check = debugger.pcs, debugger.everywhere, debugger.check
+        count = 0
+        if debugger.start(cpu):
+            return count
+        for count in range(1, max_instructions + 1):
+            step()
+            if cpu.cycles >= scheduler.deadline:
+                if scheduler.run(cpu.cycles) is None:
+                    break
+            if cpu.halted or cpu.pc == stop_pc:
+                break
+            if (everywhere or cpu.pc in pcs) and check(cpu):
                 break
+        return count
+
+    def __clock(self):
+        return self.cpu.cycles
+
+    def __dma(self, page):
+        # OAM DMA, the CPU is stalled for 513 cycles (514 on odd cycles)
+        if self.ppu is not None:
+            start = page << 8
+            self.ppu.dma([self.bus.read(addr) for addr in range(start, start + 0x100)])
+        self.cpu.cycles += 513 + (self.cpu.cycles & 1)
+
+    def __frame(self, framebuffer):
+        if self.ports is not None:
+            self.ports.frame()
+        if self.display is not None and not self.display.present(framebuffer):
+            self.scheduler.stop("closed")
+
+    def __traced(self, step):
+        cpu = self.cpu
+        record = self.trace.record
+
+        def traced():
+            address = step()
+            # the halting instruction is not reported
+            if not cpu.halted:
+                record(cpu, address)
+
+        return traced
@@ -0,0 +1,250 @@
+import attr
+
+# addressing modes and their operand formats, see
+#  http://www.obelisk.me.uk/6502/addressing.html
+MODES = {
+    "imp": "",
+    "acc": "A",
+    "imm": "#${:02X}",
+    "zp": "${:02X}",
+    "zpx": "${:02X},X",
+    "zpy": "${:02X},Y",
+    "rel": "${:04X}",
+    "abs": "${:04X}",
+    "absx": "${:04X},X",
+    "absy": "${:04X},Y",
+    "ind": "(${:04X})",
+    "indx": "(${:02X},X)",
+    "indy": "(${:02X}),Y",
+}
+
+# instruction kinds, everything else is handled by a method of its own
+READS = {
+    "adc",
+    "and",
+    "bit",
+    "cmp",
+    "cpx",
+    "cpy",
+    "eor",
+    "lda",
+    "ldx",
+    "ldy",
+    "ora",
+    "sbc",
+}
+WRITES = {"sta", "stx", "sty"}
+MODIFIES = {"asl", "dec", "inc", "lsr", "rol", "ror"}
+JUMPS = {"jmp", "jsr"}
+# status flag tested by each branch and the value that takes it
+BRANCHES = {
+    "bcc": (0b00000001, False),
+    "bcs": (0b00000001, True),
+    "beq": (0b00000010, True),
+    "bmi": (0b10000000, True),
+    "bne": (0b00000010, False),
+    "bpl": (0b10000000, False),
+    "bvc": (0b01000000, False),
+    "bvs": (0b01000000, True),
+}
+
+# official opcodes: code, mnemonic, addressing mode, size in bytes and base
+# cycles, a "+" marks one extra cycle when the effective address crosses a page,
+# see http://www.obelisk.me.uk/6502/reference.html
+SPEC = """
+00 brk  imp  1 7
+01 ora  indx 2 6
+05 ora  zp   2 3
+06 asl  zp   2 5
+08 php  imp  1 3
+09 ora  imm  2 2
+0A asl  acc  1 2
+0D ora  abs  3 4
+0E asl  abs  3 6
+10 bpl  rel  2 2
+11 ora  indy 2 5+
+15 ora  zpx  2 4
+16 asl  zpx  2 6
+18 clc  imp  1 2
+19 ora  absy 3 4+
+1D ora  absx 3 4+
+1E asl  absx 3 7
+20 jsr  abs  3 6
+21 and  indx 2 6
+24 bit  zp   2 3
+25 and  zp   2 3
+26 rol  zp   2 5
+28 plp  imp  1 4
+29 and  imm  2 2
+2A rol  acc  1 2
+2C bit  abs  3 4
+2D and  abs  3 4
+2E rol  abs  3 6
+30 bmi  rel  2 2
+31 and  indy 2 5+
+35 and  zpx  2 4
+36 rol  zpx  2 6
+38 sec  imp  1 2
+39 and  absy 3 4+
+3D and  absx 3 4+
+3E rol  absx 3 7
+40 rti  imp  1 6
+41 eor  indx 2 6
+45 eor  zp   2 3
+46 lsr  zp   2 5
+48 pha  imp  1 3
+49 eor  imm  2 2
+4A lsr  acc  1 2
+4C jmp  abs  3 3
+4D eor  abs  3 4
+4E lsr  abs  3 6
+50 bvc  rel  2 2
+51 eor  indy 2 5+
+55 eor  zpx  2 4
+56 lsr  zpx  2 6
+58 cli  imp  1 2
+59 eor  absy 3 4+
+5D eor  absx 3 4+
+5E lsr  absx 3 7
+60 rts  imp  1 6
+61 adc  indx 2 6
+65 adc  zp   2 3
+66 ror  zp   2 5
+68 pla  imp  1 4
+69 adc  imm  2 2
+6A ror  acc  1 2
+6C jmp  ind  3 5
+6D adc  abs  3 4
+6E ror  abs  3 6
+70 bvs  rel  2 2
+71 adc  indy 2 5+
+75 adc  zpx  2 4
+76 ror  zpx  2 6
+78 sei  imp  1 2
+79 adc  absy 3 4+
+7D adc  absx 3 4+
+7E ror  absx 3 7
+81 sta  indx 2 6
+84 sty  zp   2 3
+85 sta  zp   2 3
+86 stx  zp   2 3
+88 dey  imp  1 2
+8A txa  imp  1 2
+8C sty  abs  3 4
+8D sta  abs  3 4
+8E stx  abs  3 4
+90 bcc  rel  2 2
+91 sta  indy 2 6
+94 sty  zpx  2 4
+95 sta  zpx  2 4
+96 stx  zpy  2 4
+98 tya  imp  1 2
+99 sta  absy 3 5
+9A txs  imp  1 2
+9D sta  absx 3 5
+A0 ldy  imm  2 2
+A1 lda  indx 2 6
+A2 ldx  imm  2 2
+A4 ldy  zp   2 3
+A5 lda  zp   2 3
+A6 ldx  zp   2 3
+A8 tay  imp  1 2
+A9 lda  imm  2 2
+AA tax  imp  1 2
+AC ldy  abs  3 4
+AD lda  abs  3 4
+AE ldx  abs  3 4
+B0 bcs  rel  2 2
+B1 lda  indy 2 5+
+B4 ldy  zpx  2 4
+B5 lda  zpx  2 4
+B6 ldx  zpy  2 4
+B8 clv  imp  1 2
+B9 lda  absy 3 4+
+BA tsx  imp  1 2
+BC ldy  absx 3 4+
+BD lda  absx 3 4+
+BE ldx  absy 3 4+
+C0 cpy  imm  2 2
+C1 cmp  indx 2 6
+C4 cpy  zp   2 3
+C5 cmp  zp   2 3
+C6 dec  zp   2 5
+C8 iny  imp  1 2
+C9 cmp  imm  2 2
+CA dex  imp  1 2
+CC cpy  abs  3 4
+CD cmp  abs  3 4
+CE dec  abs  3 6
+D0 bne  rel  2 2
+D1 cmp  indy 2 5+
+D5 cmp  zpx  2 4
+D6 dec  zpx  2 6
+D8 cld  imp  1 2
+D9 cmp  absy 3 4+
+DD cmp  absx 3 4+
+DE dec  absx 3 7
+E0 cpx  imm  2 2
+E1 sbc  indx 2 6
+E4 cpx  zp   2 3
+E5 sbc  zp   2 3
+E6 inc  zp   2 5
+E8 inx  imp  1 2
+E9 sbc  imm  2 2
+EA nop  imp  1 2
+EC cpx  abs  3 4
+ED sbc  abs  3 4
+EE inc  abs  3 6
+F0 beq  rel  2 2
+F1 sbc  indy 2 5+
+F5 sbc  zpx  2 4
+F6 inc  zpx  2 6
+F8 sed  imp  1 2
+F9 sbc  absy 3 4+
+FD sbc  absx 3 4+
+FE inc  absx 3 7
+"""
+
+
+@attr.s(frozen=True, slots=True)
+class Opcode(object):
+    code = attr.ib()
+    mnemonic = attr.ib()
+    mode = attr.ib()
+    size = attr.ib()
+    cycles = attr.ib()
+    penalty = attr.ib(default=False)
+
+
+def parse(spec):
+    opcodes = [None] * 0x100
+    for line in spec.strip().splitlines():
+        code, mnemonic, mode, size, cycles = line.split()
+        code = int(code, 16)
+        opcodes[code] = Opcode(
+            code, mnemonic, mode, int(size), int(cycles.rstrip("+")), cycles[-1] == "+"
+        )
+    return opcodes
+
+
+OPCODES = parse(SPEC)
+
+
+def disassemble(read, pc):
+    # returns the instruction at pc as text, read fetches a byte from memory
+    op = OPCODES[read(pc)]
+    if op is None:
+        return ".db ${:02X}".format(read(pc))
+
+    operand = None
+    if op.size == 2:
+        operand = read(pc + 1)
+    elif op.size == 3:
+        operand = (read(pc + 2) << 8) + read(pc + 1)
+    if op.mode == "rel":
+        operand = (pc + 2 + operand - ((operand & 0x80) << 1)) & 0xFFFF
+
+    text = op.mnemonic.upper()
+    if op.mode != "imp":
+        text += " " + MODES[op.mode].format(operand)
+    return text
@@ -0,0 +1,336 @@
+import attr
+import logging
+import numpy as np
+import struct
+
+from .tiles import TileCache
+
+log = logging.getLogger(__name__)
+
+WIDTH = 256
+HEIGHT = 240
+
+# frame timing in CPU cycles (341 dots per scanline, 3 dots per CPU cycle)
+CYCLES_PER_FRAME = 29781
+VBLANK = 241 * 341 // 3
+PRERENDER = 261 * 341 // 3
+
+# nametable mirroring: physical table used by each of the 4 logical ones
+HORIZONTAL = (0, 0, 1, 1)
+VERTICAL = (0, 1, 0, 1)
+FOUR_SCREEN = (0, 1, 2, 3)
+SINGLE_LOWER = (0, 0, 0, 0)
+SINGLE_UPPER = (1, 1, 1, 1)
+
+STATE = struct.Struct("<BBBBBHHBBBQB")
+
+
+@attr.s
+class PPU(object):
+    ctrl = attr.ib(default=0, init=False)
+    mask = attr.ib(default=0, init=False)
+    status = attr.ib(default=0, init=False)
+    oam_addr = attr.ib(default=0, init=False)
+    # last value seen on the data bus, returned by write only registers
+    latch = attr.ib(default=0, init=False)
+    # loopy registers: current and temporary vram address, fine x and toggle
+    v = attr.ib(default=0, init=False)
+    t = attr.ib(default=0, init=False)
+    x = attr.ib(default=0, init=False)
+    w = attr.ib(default=0, init=False)
+    buffer = attr.ib(default=0, init=False)
+    # cycle where the current frame started and the next event of the frame
+    start = attr.ib(default=0, init=False)
+    event = attr.ib(default=0, init=False)
+    frames = attr.ib(default=0, init=False)
+
+    chr = attr.ib(default=None, init=False, repr=False)
+    tiles = attr.ib(default=None, init=False, repr=False)
+    # 4KB CHR bank of each pattern table, selected by the mapper
+    banks = attr.ib(factory=lambda: [0, 1], init=False, repr=False)
+    writable = attr.ib(default=False, init=False, repr=False)
+    mirroring = attr.ib(default=HORIZONTAL, init=False, repr=False)
+    vram = attr.ib(default=None, init=False, repr=False)
+    palette = attr.ib(default=None, init=False, repr=False)
+    oam = attr.ib(default=None, init=False, repr=False)
+    framebuffer = attr.ib(default=None, init=False, repr=False)
+
+    scheduler = attr.ib(default=None, init=False, repr=False)
+    nmi = attr.ib(default=None, init=False, repr=False)
+    frame = attr.ib(default=None, init=False, repr=False)
+    pending = attr.ib(default=None, init=False, repr=False)
+
+    def setup(self, bus, chr_rom, mirroring=HORIZONTAL):
+        # carts without CHR ROM come with 8KB of CHR RAM, CHR ROM is read
+        # in place
+        self.writable = not chr_rom
+        self.chr = chr_rom if chr_rom else bytearray(0x2000)
+        self.tiles = TileCache(self.chr)
+        self.banks = [0, 0]
+        self.switch_chr(0, 0)
+        self.switch_chr(1, 1)
+        self.mirroring = mirroring
+        self.vram = bytearray(0x1000)
+        self.palette = bytearray(0x20)
+        self.oam = bytearray(0x100)
+        self.framebuffer = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+
+        self.ctrl = self.mask = self.status = self.oam_addr = self.latch = 0
+        self.v = self.t = self.x = self.w = self.buffer = 0
+        self.start = self.event = self.frames = 0
+        self.events = [
+            (VBLANK, self.__vblank),
+            (PRERENDER, self.__prerender),
+            (CYCLES_PER_FRAME, self.__frame),
+        ]
+
+        bus.map(0x2000, 0x4000, handler=self, size=0x0008)
+        log.debug("PPU with %d bytes of CHR", len(self.chr))
+
+    def attach(self, scheduler, nmi=None, frame=None):
+        # frame events run from the scheduler, nmi() is raised on vblank and
+        # frame(framebuffer) is called once the frame is rendered
+        self.scheduler, self.nmi, self.frame = scheduler, nmi, frame
+        self.pending = None
+        self.__schedule()
+
+    def read(self, addr):
+        reg = addr & 7
+        if reg == 2:
+            value = (self.status & 0xE0) | (self.latch & 0x1F)
+            self.status &= 0x7F
+            self.w = 0
+        elif reg == 4:
+            value = self.oam[self.oam_addr]
+        elif reg == 7:
+            value = self.__data_read()
+        else:
+            return self.latch
+        self.latch = value
+        return value
+
+    def peek(self, addr):
+        reg = addr & 7
+        if reg == 2:
+            return (self.status & 0xE0) | (self.latch & 0x1F)
+        if reg == 4:
+            return self.oam[self.oam_addr]
+        if reg == 7 and self.v & 0x3FFF < 0x3F00:
+            return self.buffer
+        if reg == 7:
+            return self.vram_read(self.v)
+        return self.latch
+
+    def write(self, addr, data):
+        self.latch = data
+        reg = addr & 7
+        if reg == 0:
+            # enabling NMI during vblank raises it right away
+            if data & ~self.ctrl & self.status & 0x80 and self.nmi is not None:
+                self.scheduler.schedule(0, self.__nmi)
+            self.ctrl = data
+            self.t = (self.t & 0x73FF) | ((data & 0x03) << 10)
+        elif reg == 1:
+            self.mask = data
+        elif reg == 3:
+            self.oam_addr = data
+        elif reg == 4:
+            self.oam[self.oam_addr] = data
+            self.oam_addr = (self.oam_addr + 1) & 0xFF
+        elif reg == 5:
+            if self.w:
+                fine, coarse = (data & 0x07) << 12, (data & 0xF8) << 2
+                self.t = (self.t & 0x0C1F) | fine | coarse
+            else:
+                self.t = (self.t & 0x7FE0) | (data >> 3)
+                self.x = data & 0x07
+            self.w ^= 1
+        elif reg == 6:
+            if self.w:
+                self.t = (self.t & 0x7F00) | data
+                self.v = self.t
+            else:
+                self.t = (self.t & 0x00FF) | ((data & 0x3F) << 8)
+            self.w ^= 1
+        elif reg == 7:
+            self.vram_write(self.v, data)
+            self.v = (self.v + self.__increment()) & 0x7FFF
+
+    def dma(self, data):
+        # OAM DMA, copies a whole page starting at OAMADDR
+        for i, value in enumerate(data[:0x100]):
+            self.oam[(self.oam_addr + i) & 0xFF] = value
+
+    def switch_chr(self, table, bank):
+        self.banks[table] = bank % max(1, len(self.chr) >> 12)
+
+    def vram_read(self, addr):
+        addr &= 0x3FFF
+        if addr < 0x2000:
+            return self.chr[(self.banks[addr >> 12] << 12) | (addr & 0x0FFF)]
+        if addr < 0x3F00:
+            return self.vram[self.__nametable(addr)]
+        return self.palette[self.__palette(addr)]
+
+    def vram_write(self, addr, data):
+        addr &= 0x3FFF
+        if addr < 0x2000:
+            if self.writable:
+                addr = (self.banks[addr >> 12] << 12) | (addr & 0x0FFF)
+                self.chr[addr] = data
+                self.tiles.invalidate(addr)
+        elif addr < 0x3F00:
+            self.vram[self.__nametable(addr)] = data
+        else:
+            self.palette[self.__palette(addr)] = data & 0x3F
+
+    def scroll(self):
+        # scroll of the background in the 512x480 area of the 4 nametables
+        x = ((self.t & 0x001F) << 3) | self.x | ((self.t & 0x0400) >> 2)
+        y = ((self.t & 0x03E0) >> 2) | ((self.t & 0x7000) >> 12)
+        if self.t & 0x0800:
+            y += HEIGHT
+        return x, y
+
+    def render_background(self, top=0, bottom=HEIGHT):
+        # renders scanlines [top, bottom) with the current scroll and banks
+        palette = np.frombuffer(self.palette, dtype=np.uint8)
+        lines = self.framebuffer[top:bottom]
+        if not self.mask & 0x08:
+            lines[:] = palette[0]
+            return lines
+
+        bank = self.banks[(self.ctrl >> 4) & 1]
+        colored = self.tiles.colored(bank, self.palette)
+
+        scroll_x, scroll_y = self.scroll()
+        ys = (np.arange(top, bottom) + scroll_y) % (2 * HEIGHT)
+        xs = (np.arange(WIDTH) + scroll_x) % (2 * WIDTH)
+        # offset of every pixel in the colored tiles: tile row and column
+        # come from the nametables, the pixel inside the tile from the scroll
+        tiles = self.__nametables().take(ys >> 3, 0).take(xs >> 3, 1)
+        tiles += ((ys & 7) << 3)[:, None] + (xs & 7)[None, :]
+        colored.take(tiles, out=lines)
+        if self.mask & 0x01:
+            lines &= 0x30
+        if not self.mask & 0x02:
+            lines[:, :8] = palette[0]
+        return lines
+
+    def save_state(self):
+        registers = STATE.pack(
+            self.ctrl,
+            self.mask,
+            self.status,
+            self.oam_addr,
+            self.latch,
+            self.v,
+            self.t,
+            self.x,
+            self.w,
+            self.buffer,
+            self.start,
+            self.event,
+        )
+        memory = self.vram + self.palette + self.oam
+        if self.writable:
+            memory += self.chr
+        return registers + bytes(memory)
+
+    def load_state(self, data):
+        (
+            self.ctrl,
+            self.mask,
+            self.status,
+            self.oam_addr,
+            self.latch,
+            self.v,
+            self.t,
+            self.x,
+            self.w,
+            self.buffer,
+            self.start,
+            self.event,
+        ) = STATE.unpack_from(data)
+        offset = STATE.size
+        for memory in (self.vram, self.palette, self.oam):
+            memory[:] = data[offset : offset + len(memory)]
+            offset += len(memory)
+        if self.writable:
+            self.chr[:] = data[offset : offset + len(self.chr)]
+            self.tiles = TileCache(self.chr)
+        if self.scheduler is not None:
+            self.__schedule()
+
+    def __nametables(self):
+        # (60, 64) array of the 4 nametables side by side with the offset of
+        # each tile in the colored pattern table: (attribute * 256 + tile) * 64
+        tables = np.frombuffer(self.vram, dtype=np.uint8).reshape(4, 0x400)
+        tables = tables[list(self.mirroring)]
+        tiles = tables[:, :0x3C0].reshape(2, 2, 30, 32)
+        attributes = tables[:, 0x3C0:].reshape(2, 2, 8, 8)
+
+        rows, cols = np.arange(30), np.arange(32)
+        attributes = attributes[:, :, rows[:, None] >> 2, cols[None, :] >> 2]
+        shifts = ((rows & 2) << 1)[:, None] | (cols & 2)[None, :]
+        attributes = (attributes >> shifts) & 0x03
+
+        tiles = (attributes << 8 | tiles).astype(np.intp) << 6
+        return tiles.transpose(0, 2, 1, 3).reshape(60, 64)
+
+    def __nametable(self, addr):
+        table = self.mirroring[(addr >> 10) & 0x03]
+        return (table << 10) | (addr & 0x03FF)
+
+    def __palette(self, addr):
+        # backdrop entries of the sprite palettes mirror the background ones
+        index = addr & 0x1F
+        if index & 0x13 == 0x10:
+            index &= 0x0F
+        return index
+
+    def __increment(self):
+        return 32 if self.ctrl & 0x04 else 1
+
+    def __data_read(self):
+        addr = self.v
+        if addr & 0x3FFF < 0x3F00:
+            value, self.buffer = self.buffer, self.vram_read(addr)
+        else:
+            # palette reads are immediate, the buffer gets the nametable below
+            value = self.vram_read(addr)
+            self.buffer = self.vram_read(addr - 0x1000)
+        self.v = (self.v + self.__increment()) & 0x7FFF
+        return value
+
+    def __schedule(self):
+        if self.pending is not None:
+            self.scheduler.cancel(self.pending)
+        offset, _ = self.events[self.event]
+        self.pending = self.scheduler.schedule(self.start + offset, self.__fire)
+
+    def __fire(self, cycle):
+        _, handler = self.events[self.event]
+        self.event = (self.event + 1) % len(self.events)
+        self.pending = None
+        handler()
+        self.__schedule()
+
+    def __nmi(self, cycle):
+        self.nmi()
+
+    def __vblank(self):
+        self.status |= 0x80
+        self.render_background()
+        self.frames += 1
+        if self.ctrl & 0x80 and self.nmi is not None:
+            self.nmi()
+        if self.frame is not None:
+            self.frame(self.framebuffer)
+
+    def __prerender(self):
+        # clears vblank, sprite 0 hit and overflow
+        self.status &= 0x1F
+
+    def __frame(self):
+        self.start += CYCLES_PER_FRAME
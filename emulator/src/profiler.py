@@ -0,0 +1,98 @@
+import attr
+import json
+import time
+
+from .opcodes import OPCODES, disassemble
+
+
+@attr.s
+class Profiler(object):
+    # per opcode counts and wall time, installed by wrapping CPU.step so the
+    # default step carries no instrumentation at all
+    counts = attr.ib(factory=lambda: [0] * 0x100)
+    times = attr.ib(factory=lambda: [0.0] * 0x100)
+    pcs = attr.ib(factory=dict)
+    bus = attr.ib(default=None)
+
+    def wrap(self, cpu, step):
+        counts, times, pcs = self.counts, self.times, self.pcs
+        read = self.__peek(cpu.bus)
+        clock = time.perf_counter
+        self.bus = cpu.bus
+
+        def profiled():
+            pc = cpu.pc
+            opcode = read(pc)
+            start = clock()
+            address = step()
+            times[opcode] += clock() - start
+            counts[opcode] += 1
+            pcs[pc] = pcs.get(pc, 0) + 1
+            return address
+
+        return profiled
+
+    def opcodes(self):
+        rows = []
+        for code, (count, seconds) in enumerate(zip(self.counts, self.times)):
+            if not count:
+                continue
+            op = OPCODES[code]
+            name = "{} {}".format(op.mnemonic, op.mode) if op else "illegal"
+            rows.append(
+                {"opcode": code, "name": name, "count": count, "seconds": seconds}
+            )
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    def hottest(self, limit=10):
+        pcs = sorted(self.pcs.items(), key=lambda item: item[1], reverse=True)
+        return [
+            {
+                "pc": pc,
+                "count": count,
+                "instruction": disassemble(self.__peek(self.bus), pc),
+            }
+            for pc, count in pcs[:limit]
+        ]
+
+    def to_dict(self):
+        return {"opcodes": self.opcodes(), "pcs": self.hottest()}
+
+    def dump(self, stream):
+        json.dump(self.to_dict(), stream, indent=2)
+
+    def report(self):
+        rows = self.opcodes()
+        total = sum(row["seconds"] for row in rows) or 1.0
+        lines = [
+            "{:<4} {:<10} {:>10} {:>10} {:>9} {:>6}".format(
+                "op", "name", "count", "total ms", "avg ns", "%"
+            )
+        ]
+        for row in rows:
+            lines.append(
+                "0x{:02X} {:<10} {:>10} {:>10.2f} {:>9.0f} {:>6.1f}".format(
+                    row["opcode"],
+                    row["name"],
+                    row["count"],
+                    row["seconds"] * 1e3,
+                    row["seconds"] / row["count"] * 1e9,
+                    row["seconds"] / total * 100,
+                )
+            )
+        lines.append("")
+        lines.append("{:<6} {:>10}  {}".format("pc", "count", "instruction"))
+        for row in self.hottest():
+            lines.append(
+                "0x{:04x} {:>10}  {}".format(
+                    row["pc"], row["count"], row["instruction"]
+                )
+            )
+        return "\n".join(lines)
+
+    def __peek(self, bus):
+        # side effect free reads, profiling must not touch device registers
+        def peek(addr):
+            return bus.read_target(addr & 0xFFFF)[1]
+
+        return peek
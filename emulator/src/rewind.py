@@ -0,0 +1,86 @@
+import attr
+import collections
+import logging
+import zlib
+
+log = logging.getLogger(__name__)
+
+# frames per second of emulation (NTSC)
+FPS = 60
+
+
+def xor(a, b):
+    size = len(a)
+    value = int.from_bytes(a, "little") ^ int.from_bytes(b, "little")
+    return value.to_bytes(size, "little")
+
+
+@attr.s
+class Rewind(object):
+    # keeps the last frames as a ring of compressed snapshots: the newest state
+    # is kept as is and every older frame is either a keyframe or the XOR delta
+    # to the frame after it, so stepping back a frame is a single delta
+    nes = attr.ib()
+    seconds = attr.ib(default=10)
+    interval = attr.ib(default=30)
+    budget = attr.ib(default=16 * 1024 * 1024)
+
+    def __attrs_post_init__(self):
+        self.entries = collections.deque()
+        self.head = None
+        self.size = 0
+        self.frame = 0
+
+    def __len__(self):
+        # number of frames that can be rewound
+        return len(self.entries)
+
+    def push(self):
+        # stores the current state, meant to be called once per frame
+        state = self.nes.save_state()
+        if self.head is not None:
+            if self.frame % self.interval == 0 or len(state) != len(self.head):
+                entry = True, zlib.compress(self.head, 1)
+            else:
+                entry = False, zlib.compress(xor(self.head, state), 1)
+            self.entries.append(entry)
+            self.size += len(entry[1])
+        self.head = state
+        self.frame += 1
+        self.__evict()
+
+    def rewind(self, frames=1):
+        # restores the state from frames ago, returns how many were rewound
+        frames = min(frames, len(self.entries))
+        if not frames:
+            return 0
+
+        target = len(self.entries) - frames
+        start = len(self.entries) - 1
+        # a keyframe between the target and the head avoids applying deltas
+        for index in range(target, len(self.entries)):
+            if self.entries[index][0]:
+                start = index
+                break
+
+        state = self.head
+        for index in range(len(self.entries) - 1, target - 1, -1):
+            keyframe, data = self.entries.pop()
+            self.size -= len(data)
+            if index > start:
+                continue
+            if keyframe:
+                state = zlib.decompress(data)
+            else:
+                state = xor(state, zlib.decompress(data))
+
+        self.head = state
+        self.frame -= frames
+        self.nes.load_state(state)
+        return frames
+
+    def __evict(self):
+        limit = self.seconds * FPS
+        while self.entries and (len(self.entries) > limit or self.size > self.budget):
+            _, data = self.entries.popleft()
+            self.size -= len(data)
@@ -0,0 +1,51 @@
+import attr
+import heapq
+import itertools
+
+NEVER = float("inf")
+
+
+@attr.s
+class Scheduler(object):
+    # device events keyed by CPU cycle: the run loop only compares the CPU
+    # clock against deadline and runs the events that are due from there
+    def __attrs_post_init__(self):
+        self.queue = []
+        self.order = itertools.count()
+        self.deadline = NEVER
+        self.reason = None
+
+    def schedule(self, cycle, callback):
+        # callback(cycle) runs at the first instruction boundary after cycle,
+        # events at the same cycle run in the order they were scheduled
+        event = [cycle, next(self.order), callback]
+        heapq.heappush(self.queue, event)
+        self.deadline = min(self.deadline, cycle)
+        return event
+
+    def cancel(self, event):
+        # the entry stays in the queue and is dropped when it is reached
+        event[2] = None
+
+    def stop(self, reason):
+        # makes run return None, the run loop leaves with this reason; the
+        # deadline makes it look at once when stopped from outside an event
+        self.reason = reason
+        self.deadline = 0
+
+    def run(self, cycles):
+        # runs the events due by cycles, returns the next deadline or None
+        queue = self.queue
+        while queue and queue[0][0] <= cycles and self.reason is None:
+            cycle, _, callback = heapq.heappop(queue)
+            if callback is not None:
+                callback(cycle)
+        self.deadline = queue[0][0] if queue else NEVER
+        if self.reason is not None:
+            return None
+        return self.deadline
+
+    def resume(self):
+        # clears the reason of the last stop
+        reason, self.reason = self.reason, None
+        return reason
@@ -1,67 +1,62 @@
-# -*- coding: utf-8 -*-
-# código básico de tela
-import time
-
+import attr
+import logging
 import pygame
 
-# definindo cores
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-BLUE = (0, 0, 255)
-GREEN = (0, 255, 0)
-RED = (255, 0, 0)
-
-pygame.init()  # inicializa objetos
-
-screen = pygame.display.set_mode([640, 480])  # tamanho
-
-# carregando fonte
-font = pygame.font.SysFont(None, 55)
-
-pygame.display.set_caption("Emulator NES")  # nome da janela
-
-# variáveis da bola
-position_x = 300
-position_y = 200
-velocity_x = 1
-velocity_y = 1
-
-# iniciando o loop de jogo
-while True:
-    # PROCESSAMENTO DE ENTRADA
-
-    # capturando eventos
-    event = pygame.event.poll()
-    # caso o evento QUIT (clicar no x da janela) seja disparado
-    if event.type == pygame.QUIT:
-        # saia do loop finalizando o programa
-        break
-
-    # ATUALIZAÇÃO DO JOGO
-
-    # movendo a bola
-    position_x += velocity_x
-    position_y += velocity_y
-
-    # mudando a direção no eixo x nas bordas
-    if position_x > 600:
-        velocity_x = -1
-    elif position_x < 0:
-        velocity_x = 1
-
-    # mudando a direção no eixo y nas bordas
-    if position_y > 440:
-        velocity_y = -1
-    elif position_y < 0:
-        velocity_y = 1
-
-    # DESENHO
-
-    # preenchendo o fundo com preto
-    screen.fill(BLACK)
-
-    # desenhando a bola
-    pygame.draw.ellipse(screen, RED, [position_x, position_y, 40, 40])
-
-    # atualizando a tela
-    pygame.display.flip()
+from .ppu import HEIGHT, WIDTH
+
+log = logging.getLogger(__name__)
+
+# RGB of the 64 colors of the 2C02
+PALETTE = [
+    (value >> 16, (value >> 8) & 0xFF, value & 0xFF)
+    for value in (
+        # fmt: off
+        0x7C7C7C, 0x0000FC, 0x0000BC, 0x4428BC, 0x940084, 0xA80020, 0xA81000, 0x881400,
+        0x503000, 0x007800, 0x006800, 0x005800, 0x004058, 0x000000, 0x000000, 0x000000,
+        0xBCBCBC, 0x0078F8, 0x0058F8, 0x6844FC, 0xD800CC, 0xE40058, 0xF83800, 0xE45C10,
+        0xAC7C00, 0x00B800, 0x00A800, 0x00A844, 0x008888, 0x000000, 0x000000, 0x000000,
+        0xF8F8F8, 0x3CBCFC, 0x6888FC, 0x9878F8, 0xF878F8, 0xF85898, 0xF87858, 0xFCA044,
+        0xF8B800, 0xB8F818, 0x58D854, 0x58F898, 0x00E8D8, 0x787878, 0x000000, 0x000000,
+        0xFCFCFC, 0xA4E4FC, 0xB8B8F8, 0xD8B8F8, 0xF8B8F8, 0xF8A4C0, 0xF0D0B0, 0xFCE0A8,
+        0xF8D878, 0xD8F878, 0xB8F8B8, 0xB8F8D8, 0x00FCFC, 0xF8D8F8, 0x000000, 0x000000,
+        # fmt: on
+    )
+]
+
+
+@attr.s
+class Screen(object):
+    # pygame window showing the PPU framebuffer: the color indices are blitted
+    # in one call to an 8 bit surface holding the NES palette, scaled by SDL
+    # and presented at most fps times per second
+    scale = attr.ib(default=2)
+    fps = attr.ib(default=60)
+    title = attr.ib(default="Emulator NES")
+
+    def open(self):
+        pygame.display.init()
+        size = WIDTH * self.scale, HEIGHT * self.scale
+        self.window = pygame.display.set_mode(size)
+        pygame.display.set_caption(self.title)
+
+        self.surface = pygame.Surface((WIDTH, HEIGHT), depth=8)
+        self.surface.set_palette(PALETTE)
+        self.scaled = pygame.Surface(size, depth=8)
+        self.scaled.set_palette(PALETTE)
+        self.clock = pygame.time.Clock()
+        self.frames = 0
+        log.debug("window of %dx%d", *size)
+
+    def present(self, framebuffer):
+        # shows a (240, 256) frame, returns False once the window is closed
+        pygame.surfarray.blit_array(self.surface, framebuffer.T)
+        pygame.transform.scale(self.surface, self.scaled.get_size(), self.scaled)
+        self.window.blit(self.scaled, (0, 0))
+        pygame.display.flip()
+        self.clock.tick(self.fps)
+        self.frames += 1
+        return not any(e.type == pygame.QUIT for e in pygame.event.get())
+
+    def close(self):
+        log.debug("%d frames shown", self.frames)
+        pygame.display.quit()
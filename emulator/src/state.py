@@ -0,0 +1,55 @@
+import struct
+
+# save state file format, all values little endian:
+#   header: magic "NESS", version (u16), number of chunks (u16)
+#   chunks: tag (4 bytes), size (u32) and size bytes of payload
+MAGIC = b"NESS"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+CHUNK = struct.Struct("<4sI")
+
+
+class StateError(Exception):
+    pass
+
+
+def pack(chunks):
+    parts = [HEADER.pack(MAGIC, VERSION, len(chunks))]
+    for tag, payload in chunks:
+        parts.append(CHUNK.pack(tag, len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def unpack(blob):
+    view = memoryview(blob)
+    if len(view) < HEADER.size:
+        raise StateError("truncated save state")
+    magic, version, count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise StateError("not a save state")
+    if version != VERSION:
+        raise StateError("unsupported save state version: {}".format(version))
+
+    chunks = {}
+    offset = HEADER.size
+    for _ in range(count):
+        if offset + CHUNK.size > len(view):
+            raise StateError("corrupted save state")
+        tag, size = CHUNK.unpack_from(view, offset)
+        offset += CHUNK.size
+        chunks[tag] = view[offset : offset + size]
+        offset += size
+    if offset != len(view):
+        raise StateError("corrupted save state")
+    return chunks
+
+
+def save(path, blob):
+    with open(path, "wb") as f:
+        f.write(blob)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,91 @@
+import attr
+import click
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .apu import APU
+from .bus import BUS
+from .cartridge import Cartridge
+from .cpu import CPU
+from .nes import NES
+from .ppu import PPU
+from .trace import CompareTrace, TraceMismatch, load_records
+
+
+@attr.s
+class Result(object):
+    name = attr.ib()
+    passed = attr.ib()
+    elapsed = attr.ib()
+    message = attr.ib(default="")
+
+
+def collect(bin_dir, res_dir):
+    for name in sorted(os.listdir(bin_dir)):
+        yield name, os.path.join(bin_dir, name), os.path.join(res_dir, name + ".r")
+
+
+def compare(inpath, outpath):
+    # runs the program against its expected trace, returns the trace
+    cartridge = Cartridge.open(inpath)
+    trace = CompareTrace(load_records(outpath))
+    nes = NES(CPU(), PPU(), BUS(), trace, apu=APU())
+    try:
+        nes.run(cartridge)
+    finally:
+        nes.close()
+    return trace
+
+
+def run_test(name, inpath, outpath):
+    start = time.perf_counter()
+    try:
+        trace = compare(inpath, outpath)
+    except TraceMismatch as e:
+        return Result(name, False, time.perf_counter() - start, str(e))
+    except Exception as e:
+        # any other error fails this test alone, the suite goes on
+        return Result(name, False, time.perf_counter() - start, repr(e))
+    elapsed = time.perf_counter() - start
+
+    if not trace.done():
+        message = "missing output from line {}".format(trace.line)
+        return Result(name, False, elapsed, message)
+    return Result(name, True, elapsed)
+
+
+def run_suite(bin_dir, res_dir, jobs=None):
+    tests = list(collect(bin_dir, res_dir))
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(run_test, *test) for test in tests]
+        for future in futures:
+            yield future.result()
+
+
+@click.command()
+@click.option("--bin", "bin_dir", default="emulator/bin", help="Assembled tests.")
+@click.option("--res", "res_dir", default="emulator/res", help="Expected traces.")
+@click.option("-j", "--jobs", type=int, help="Number of worker processes.")
+def cli(bin_dir, res_dir, jobs):
+    start = time.perf_counter()
+    passed = failed = 0
+    for result in run_suite(bin_dir, res_dir, jobs):
+        status = "PASSED" if result.passed else "FAILED"
+        click.echo(
+            "Running {}: {} [{:.1f} ms]".format(
+                result.name, status, result.elapsed * 1e3
+            )
+        )
+        if result.passed:
+            passed += 1
+        else:
+            failed += 1
+            click.echo(result.message)
+
+    click.echo("- {} tests passed".format(passed))
+    click.echo("- {} tests failed".format(failed))
+    click.echo("- {:.2f} s".format(time.perf_counter() - start))
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,69 @@
+import attr
+import collections
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# bit planes of a tile row are unpacked from the msb
+SHIFTS = np.arange(7, -1, -1, dtype=np.uint8)
+SUBPALETTES = np.arange(4)[:, None, None, None]
+
+
+def decode(data):
+    # 2bpp tiles (16 bytes each) into an array of (tiles, 8, 8) color indices
+    tiles = np.frombuffer(bytes(data), dtype=np.uint8).reshape(-1, 2, 8)
+    low = (tiles[:, 0, :, None] >> SHIFTS) & 1
+    high = (tiles[:, 1, :, None] >> SHIFTS) & 1
+    return low | (high << 1)
+
+
+@attr.s
+class TileCache(object):
+    # CHR decoded once into (tiles, 8, 8) color indices, writes to CHR RAM only
+    # mark their tile and colored variants of a pattern table are kept per
+    # background palette, evicting the least recently used
+    data = attr.ib(repr=False)
+    size = attr.ib(default=16)
+
+    def __attrs_post_init__(self):
+        self.tiles = decode(self.data)
+        self.dirty = set()
+        self.variants = collections.OrderedDict()
+        log.debug("decoded %d tiles", len(self.tiles))
+
+    def invalidate(self, addr):
+        self.dirty.add(addr >> 4)
+
+    def pattern(self, bank):
+        # the 256 tiles of the pattern table at bank * 0x1000
+        self.__refresh()
+        return self.tiles[bank << 8 : (bank + 1) << 8]
+
+    def colored(self, bank, palette):
+        # (4, 256, 8, 8) NES colors of the pattern table for each of the 4
+        # background palettes, color 0 of all of them is the backdrop
+        colors = bytearray(palette[:16])
+        colors[4::4] = colors[0:1] * 3
+        key = bank, bytes(colors)
+
+        self.__refresh()
+        variant = self.variants.get(key)
+        if variant is not None:
+            self.variants.move_to_end(key)
+            return variant
+
+        colors = np.frombuffer(key[1], dtype=np.uint8).reshape(4, 4)
+        variant = colors[SUBPALETTES, self.pattern(bank)[None]]
+        self.variants[key] = variant
+        if len(self.variants) > self.size:
+            self.variants.popitem(last=False)
+        return variant
+
+    def __refresh(self):
+        if not self.dirty:
+            return
+        for tile in self.dirty:
+            self.tiles[tile] = decode(self.data[tile << 4 : (tile + 1) << 4])[0]
+        self.dirty.clear()
+        self.variants.clear()
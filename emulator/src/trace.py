@@ -0,0 +1,218 @@
+import attr
+import functools
+import itertools
+import logging
+import queue
+import re
+import sys
+import threading
+
+from .opcodes import disassemble
+
+log = logging.getLogger(__name__)
+
+STATUS = (
+    "| pc = 0x{:04x} | a = 0x{:02x} | x = 0x{:02x} "
+    "| y = 0x{:02x} | sp = 0x{:04x} | p[NV-BDIZC] = {:08b} |"
+)
+MEMORY = " MEM[0x{:04x}] = 0x{:02x} |"
+# a record is (pc, a, x, y, sp, status, target, value), named as printed
+FIELDS = ["pc", "a", "x", "y", "sp", "p", "mem", "value"]
+PATTERN = re.compile(
+    r"\| pc = 0x(\w{4}) \| a = 0x(\w{2}) \| x = 0x(\w{2}) \| y = 0x(\w{2}) "
+    r"\| sp = 0x(\w{4}) \| p\[NV-BDIZC\] = ([01]{8}) \|"
+    r"(?: MEM\[0x(\w{4})\] = 0x(\w{2}) \|)?$"
+)
+
+
+def snapshot(cpu, address=None):
+    # (pc, a, x, y, sp, status, target, value), target is None without address
+    if address is None:
+        return cpu.pc, cpu.a, cpu.x, cpu.y, cpu.sp, cpu.status, None, None
+    target, value = cpu.bus.read_target(address)
+    return cpu.pc, cpu.a, cpu.x, cpu.y, cpu.sp, cpu.status, target, value
+
+
+def format_record(record):
+    msg = STATUS.format(*record[:6])
+    if record[6] is not None:
+        msg += MEMORY.format(record[6], record[7])
+    return msg
+
+
+def format_field(number):
+    return "none" if number is None else "0x{:02x}".format(number)
+
+
+def parse_record(line):
+    # inverse of format_record
+    match = PATTERN.match(line)
+    if match is None:
+        raise ValueError("not a trace line: {!r}".format(line))
+    return tuple(
+        None if value is None else int(value, 2 if field == "p" else 16)
+        for field, value in zip(FIELDS, match.groups())
+    )
+
+
+def read_records(path):
+    # parses a trace file lazily, one record per line
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line:
+                yield parse_record(line)
+
+
+@functools.lru_cache(maxsize=None)
+def load_records(path):
+    # parsed once per process, reruns of the same trace skip the parsing
+    return tuple(read_records(path))
+
+
+@attr.s
+class NullTrace(object):
+    def record(self, cpu, address=None):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@attr.s
+class BufferTrace(object):
+    records = attr.ib(factory=list)
+
+    def record(self, cpu, address=None):
+        self.records.append(snapshot(cpu, address))
+
+    def lines(self):
+        return [format_record(r) for r in self.records]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@attr.s
+class ThreadedTrace(object):
+    # records are batched on the emulator thread and formatted and written
+    # by a background thread in large chunks
+    stream = attr.ib(default=None)
+    batch = attr.ib(default=4096)
+
+    def __attrs_post_init__(self):
+        if self.stream is None:
+            self.stream = sys.stdout
+        self.records = []
+        self.error = None
+        self.queue = queue.Queue(maxsize=16)
+        self.thread = threading.Thread(target=self.__write, daemon=True)
+        self.thread.start()
+
+    def record(self, cpu, address=None):
+        self.records.append(snapshot(cpu, address))
+        if len(self.records) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.records:
+            self.queue.put(self.records)
+            self.records = []
+        # a failed write (e.g. a closed pipe) is raised on the emulator thread
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.records and self.error is None:
+            self.queue.put(self.records)
+        self.records = []
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        self.stream.flush()
+
+    def __write(self):
+        while True:
+            records = self.queue.get()
+            if records is None:
+                break
+            if self.error is not None:
+                # keeps draining so the emulator thread never blocks
+                continue
+            try:
+                self.stream.write("\n".join(map(format_record, records)) + "\n")
+            except Exception as e:
+                self.error = e
+        log.debug("trace writer finished")
+
+
+class TraceMismatch(Exception):
+    pass
+
+
+@attr.s
+class CompareTrace(object):
+    # checks every record against the expected ones, any iterable of parsed
+    # records, as they are produced and stops at the first difference
+    expected = attr.ib(converter=iter)
+    line = attr.ib(default=0)
+
+    def __attrs_post_init__(self):
+        # pc of the instruction whose effects the next record shows
+        self.pc = None
+
+    def record(self, cpu, address=None):
+        record = snapshot(cpu, address)
+        expected = next(self.expected, None)
+        if record != expected:
+            raise TraceMismatch(self.__describe(cpu, record, expected))
+        self.pc = record[0]
+        self.line += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def done(self):
+        # peeks for expected records left over
+        left = next(self.expected, None)
+        if left is not None:
+            self.expected = itertools.chain([left], self.expected)
+        return left is None
+
+    def __describe(self, cpu, record, expected):
+        if expected is None:
+            return "unexpected line {}: {}".format(self.line, format_record(record))
+
+        def read(addr):
+            return cpu.bus.read_target(addr & 0xFFFF)[1]
+
+        pc = self.pc
+        if pc is None:
+            pc = (read(0xFFFD) << 8) | read(0xFFFC)
+        pairs = enumerate(zip(record, expected))
+        field = next(i for i, (got, want) in pairs if got != want)
+        return (
+            "wrong {} at line {}: {} instead of {}\n"
+            "  after    0x{:04x}: {}\n"
+            "  got      {}\n"
+            "  expected {}".format(
+                FIELDS[field],
+                self.line,
+                format_field(record[field]),
+                format_field(expected[field]),
+                pc,
+                disassemble(read, pc),
+                format_record(record),
+                format_record(expected),
+            )
+        )
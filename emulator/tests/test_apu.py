@@ -0,0 +1,147 @@
+import numpy as np
+
+from src.apu import APU, FRAME_IRQ, RATE
+from src.bus import BUS
+from src.ppu import CYCLES_PER_FRAME
+from src.scheduler import Scheduler
+
+
+class Clock(object):
+    cycles = 0
+
+    def __call__(self):
+        return self.cycles
+
+
+def make_apu(irq=None):
+    bus, scheduler, clock = BUS(), Scheduler(), Clock()
+    apu = APU()
+    frames = []
+    apu.setup(bus, scheduler, clock, irq, output=frames.append)
+    return apu, bus, scheduler, clock, frames
+
+
+def test_pulse():
+    apu, bus, scheduler, clock, frames = make_apu()
+    # pulse 1 at 440 Hz: duty 50%, length halted, constant volume 15
+    for addr, data in [(0x4015, 0x01), (0x4000, 0xBF), (0x4002, 0xFD), (0x4003, 0)]:
+        bus.write(addr, data)
+    scheduler.run(CYCLES_PER_FRAME)
+
+    samples = frames[0]
+    assert samples.dtype == np.float32
+    assert abs(len(samples) - RATE / 60) < 2
+    spectrum = np.abs(np.fft.rfft(samples - samples.mean()))
+    peak = np.argmax(spectrum) * RATE / len(samples)
+    assert abs(peak - 440) < 60
+    assert bus.read(0x4015) & 0x01
+
+
+def test_writes_in_time():
+    apu, bus, scheduler, clock, frames = make_apu()
+    bus.write(0x4015, 0x01)
+    bus.write(0x4000, 0xBF)
+    bus.write(0x4002, 0xFD)
+    # note starts halfway through the frame
+    clock.cycles = CYCLES_PER_FRAME // 2
+    bus.write(0x4003, 0)
+    scheduler.run(CYCLES_PER_FRAME)
+
+    half = len(frames[0]) // 2
+    assert np.ptp(frames[0][: half - 2]) == 0
+    assert np.ptp(frames[0][half + 2 :]) > 0
+
+
+def test_length_counter():
+    apu, bus, scheduler, clock, frames = make_apu()
+    # length index 1 (254 half frames) is stopped by disabling the channel
+    bus.write(0x4015, 0x0F)
+    bus.write(0x400F, 0x08)
+    assert apu.peek(0x4015) == 0
+    clock.cycles = 10
+    assert bus.read(0x4015) == 0x08
+    bus.write(0x4015, 0x00)
+    clock.cycles = 20
+    assert bus.read(0x4015) == 0x00
+
+
+def test_frame_irq():
+    irqs = []
+    apu, bus, scheduler, clock, frames = make_apu(lambda: irqs.append(1) or False)
+    clock.cycles = FRAME_IRQ
+    scheduler.run(FRAME_IRQ)
+    assert bus.read(0x4015) & 0x40
+    assert not bus.read(0x4015) & 0x40
+    # masked IRQs are retried while the flag is up
+    assert irqs == [1]
+
+    # inhibited by $4017
+    apu, bus, scheduler, clock, frames = make_apu(lambda: irqs.append(1))
+    bus.write(0x4017, 0x40)
+    scheduler.run(FRAME_IRQ * 2)
+    assert not apu.peek(0x4015) & 0x40
+
+
+def test_dmc():
+    apu, bus, scheduler, clock, frames = make_apu()
+    bus.write(0x4011, 0x20)
+    scheduler.run(CYCLES_PER_FRAME)
+    assert apu.dmc.level == 0x20
+
+    # one byte of ones at $C000 raises the level by 16 and ends the sample
+    bus.memory[0xC000] = 0xFF
+    bus.write(0x4012, 0x00)
+    bus.write(0x4013, 0x00)
+    bus.write(0x4015, 0x10)
+    scheduler.run(2 * CYCLES_PER_FRAME)
+    assert apu.dmc.level == 0x30
+    assert frames[1][-1] > frames[1][0]
+
+
+def test_state():
+    apu, bus, scheduler, clock, frames = make_apu()
+    bus.write(0x4015, 0x01)
+    bus.write(0x4000, 0xBF)
+    bus.write(0x4002, 0xFD)
+    bus.write(0x4003, 0x08)
+    data = apu.save_state()
+    scheduler.run(CYCLES_PER_FRAME)
+    first = frames[-1]
+
+    apu.load_state(data)
+    scheduler.run(CYCLES_PER_FRAME)
+    assert np.array_equal(frames[-1], first)
+
+    # the 5-step mode has no frame IRQ to schedule again
+    irqs = []
+    apu, bus, scheduler, clock, frames = make_apu(lambda: irqs.append(1))
+    bus.write(0x4017, 0x80)
+    apu.load_state(apu.save_state())
+    clock.cycles = FRAME_IRQ * 2
+    scheduler.run(clock.cycles)
+    assert (irqs, apu.frame_irq) == ([], 0)
+
+
+def test_state_frame_boundary():
+    # saved right before the frame event, the next frame has no samples
+    apu, bus, scheduler, clock, frames = make_apu()
+    bus.write(0x4015, 0x01)
+    clock.cycles = CYCLES_PER_FRAME
+    apu.load_state(apu.save_state())
+    scheduler.run(CYCLES_PER_FRAME)
+    assert frames[-1].dtype == np.float32 and len(frames[-1]) == 0
+
+
+def test_state_mid_frame():
+    # samples rendered after the save are not mixed into the next frame
+    apu, bus, scheduler, clock, frames = make_apu()
+    bus.write(0x4015, 0x01)
+    clock.cycles = CYCLES_PER_FRAME // 2
+    data = apu.save_state()
+    clock.cycles = CYCLES_PER_FRAME * 3 // 4
+    apu.flush(clock.cycles)
+
+    apu.load_state(data)
+    clock.cycles = CYCLES_PER_FRAME // 2
+    scheduler.run(CYCLES_PER_FRAME)
+    assert abs(len(frames[-1]) - RATE / 60 / 2) < 2
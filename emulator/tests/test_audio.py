@@ -0,0 +1,65 @@
+import numpy as np
+import threading
+
+from src.audio import MAX_DELTA, AudioSink, NullAudio, resample
+
+
+def test_resample():
+    samples = np.arange(10, dtype=np.float32)
+    assert resample(samples, 10) is samples
+    output = resample(samples, 19)
+    assert len(output) == 19 and output.dtype == np.float32
+    assert (output[0], output[-1]) == (0, 9)
+
+
+def test_rate_control():
+    sink = AudioSink(rate=1000, latency=0.1)
+    assert (sink.target, sink.capacity) == (100, 400)
+    # below the target the frame is stretched, above it is shrunk
+    sink.write(np.ones(100, dtype=np.float32))
+    assert sink.size == round(100 * (1 + MAX_DELTA))
+    sink.write(np.ones(200, dtype=np.float32))
+    assert sink.size == 101 + round(200 * (1 - MAX_DELTA))
+
+
+def test_ring_buffer():
+    sink = AudioSink(rate=1000, latency=0.1)
+    sink.write(np.arange(1, 101, dtype=np.float32))
+    output = sink.read(60)
+    assert np.allclose(np.diff(output), 1, atol=0.05)
+
+    # the write pointer wraps around the end of the buffer
+    for _ in range(3):
+        sink.write(np.ones(100, dtype=np.float32))
+    assert (sink.overruns, sink.start) == (0, 60)
+    sink.write(np.ones(100, dtype=np.float32))
+    assert sink.size == sink.capacity
+    assert sink.overruns == 1
+
+    assert len(sink.read(sink.capacity)) == sink.capacity
+    assert not sink.read(10).any()
+    assert sink.underruns == 1
+
+
+def test_threads():
+    sink = AudioSink(rate=44100)
+    read = []
+
+    def drain():
+        read.extend(sink.read(256) for _ in range(50))
+
+    thread = threading.Thread(target=drain)
+    thread.start()
+    for _ in range(20):
+        sink.write(np.full(735, 0.5, dtype=np.float32))
+    thread.join()
+    assert 0 <= sink.size <= sink.capacity
+    assert len(read) == 50
+
+
+def test_null():
+    sink = NullAudio()
+    sink.open()
+    sink.write(np.zeros(735, dtype=np.float32))
+    sink.close()
+    assert (sink.samples, sink.underruns, sink.overruns) == (735, 0, 0)
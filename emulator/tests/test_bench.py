@@ -0,0 +1,11 @@
+from src.bench import compare, run
+
+
+def test_bench():
+    results = run(count=200, repeat=1, only={"lda", "sta", "jmp", "jsr", "pha"})
+    assert set(results["modes"]) >= {"read_imm", "write_indy", "other_ind"}
+    assert "jsr+rts_abs" in results["opcodes"]
+    assert compare(results, results, 0.1) == []
+
+    slower = dict(results, modes={"read_imm": {"ns": 1e9}})
+    assert compare(results, slower, 0.1)[0][0] == "read_imm"
@@ -0,0 +1,71 @@
+from src.bus import BUS
+
+
+class Device(object):
+    def __init__(self):
+        self.writes = []
+
+    def read(self, addr):
+        return addr & 0xFF
+
+    def peek(self, addr):
+        return 0
+
+    def write(self, addr, data):
+        self.writes.append((addr, data))
+
+
+def test_ram_mirrors():
+    bus = BUS()
+    bus.map(0x0000, 0x2000, size=0x0800)
+    assert bus.write(0x1801, 0x42) == 0x0001
+    assert bus.read(0x0801) == 0x42
+    assert bus.read_target(0x1001) == (0x0001, 0x42)
+
+
+def test_read_double():
+    bus = BUS()
+    bus.map(0x0000, 0x2000, size=0x0800)
+    bus.write_block((0x00FF, 0x0102), [0x34, 0x12, 0x56])
+    # within a page and across the page boundary
+    assert bus.read_double(0x0100) == 0x5612
+    assert bus.read_double(0x08FF) == 0x1234
+    device = Device()
+    bus.map(0x4000, 0x4100, handler=device)
+    assert bus.read_double(0x4016) == 0x1716
+
+
+def test_small_mirrors():
+    bus = BUS()
+    bus.map(0x2000, 0x4000, size=0x0008)
+    assert bus.write(0x3FFA, 0x10) == 0x2002
+    assert bus.read(0x200A) == 0x10
+
+
+def test_rom_mirrors():
+    bus = BUS()
+    bus.map(0x8000, 0x10000, size=0x4000)
+    bus.write_block((0x8000, 0xC000), bytes(range(256)) * 0x40)
+    assert bus.read(0xC001) == 0x01
+    assert bus.read_double(0xFFFE) == 0xFFFE
+    assert bus.read_target(0xE987) == (0xA987, 0x87)
+
+
+def test_handlers():
+    bus = BUS()
+    device = Device()
+    bus.map(0x4000, 0x4100, handler=device)
+    assert bus.read(0x4016) == 0x16
+    assert bus.read_target(0x4016) == (0x4016, 0)
+    bus.write(0x4014, 0x02)
+    assert device.writes == [(0x4014, 0x02)]
+
+
+def test_buffer_with_register_writes():
+    bus = BUS()
+    device = Device()
+    bus.map(0x8000, 0x10000, handler=device, buffer=bytearray(range(256)) * 0x80)
+    assert bus.read(0x8010) == 0x10
+    bus.write(0x8010, 0xFF)
+    assert bus.read(0x8010) == 0x10
+    assert device.writes == [(0x8010, 0xFF)]
@@ -0,0 +1,77 @@
+import pytest
+
+from src.cartridge import Cartridge, CartridgeError
+from src.ppu import FOUR_SCREEN, HORIZONTAL, VERTICAL
+
+
+def make_image(header, prg, chr=b"", trainer=b""):
+    return b"NES\x1a" + bytes(header) + bytes(12 - len(header)) + trainer + prg + chr
+
+
+def test_ines():
+    prg = bytes(range(256)) * 128
+    image = make_image([2, 1, 0x13, 0x40, 0, 1], prg, b"\x07" * 0x2000)
+    cartridge = Cartridge.parse(image)
+    assert not cartridge.nes2
+    assert cartridge.mapper == 0x41
+    assert cartridge.mirroring == VERTICAL
+    assert cartridge.battery
+    assert cartridge.region == "PAL"
+    assert cartridge.prg_ram == 0x2000
+    assert cartridge.chr_ram == 0
+    assert bytes(cartridge.prg) == prg
+    assert bytes(cartridge.chr_bank(0)) == b"\x07" * 0x2000
+    # banks wrap around like the address lines do
+    assert cartridge.prg_bank(3).tobytes() == prg[0x4000:]
+    assert cartridge.prg_bank(1, 0x2000).tobytes() == prg[0x2000:0x4000]
+
+
+def test_nes2():
+    # mapper 0x123 submapper 2, 0x104 PRG banks, CHR of 2^13 * 3 bytes
+    header = [0x04, 0x35, 0x38, 0x28, 0x21, 0xF1, 0x07, 0x70]
+    prg = bytes(0x104 * 0x4000)
+    cartridge = Cartridge.parse(make_image(header, prg, bytes(0x6000)))
+    assert cartridge.nes2
+    assert (cartridge.mapper, cartridge.submapper) == (0x123, 2)
+    assert cartridge.mirroring == FOUR_SCREEN
+    assert len(cartridge.prg) == len(prg)
+    assert len(cartridge.chr) == 0x6000
+    assert cartridge.prg_ram == 64 << 7
+    assert cartridge.chr_ram == 64 << 7
+
+
+def test_trainer():
+    prg = b"\xea" * 0x4000
+    image = make_image([1, 0, 0x04], prg, trainer=b"\x01" * 0x200)
+    cartridge = Cartridge.parse(image)
+    assert cartridge.mirroring == HORIZONTAL
+    assert bytes(cartridge.trainer) == b"\x01" * 0x200
+    assert bytes(cartridge.prg) == prg
+    # no CHR ROM means CHR RAM
+    assert cartridge.chr_ram == 0x2000
+
+
+def test_invalid():
+    with pytest.raises(CartridgeError):
+        Cartridge.parse(b"NES\x00" + bytes(12 + 0x4000))
+    with pytest.raises(CartridgeError):
+        Cartridge.parse(make_image([0, 0], b""))
+    with pytest.raises(CartridgeError, match="truncated"):
+        Cartridge.parse(make_image([2, 0], bytes(0x4000)))
+
+
+def test_open(tmp_path):
+    path = tmp_path / "rom.nes"
+    path.write_bytes(make_image([1, 1], b"\x01" * 0x4000, b"\x02" * 0x1000))
+    cartridge = Cartridge.open(str(path))
+    assert isinstance(cartridge.prg, memoryview)
+    assert cartridge.prg.readonly
+    assert bytes(cartridge.prg[:2]) == b"\x01\x01"
+    # missing CHR data reads as 0, in whole 8KB banks
+    assert len(cartridge.chr) == 0x2000
+    assert bytes(cartridge.chr[0xFFF:0x1001]) == b"\x02\x00"
+
+    empty = tmp_path / "empty.nes"
+    empty.write_bytes(b"")
+    with pytest.raises(CartridgeError):
+        Cartridge.open(str(empty))
@@ -0,0 +1,70 @@
+from src.bus import BUS
+from src.cpu import CPU
+
+
+def make_cpu(program, start=0xC000):
+    rom = bytearray(0x4000)
+    offset = start - 0xC000
+    rom[offset : offset + len(program)] = program
+    rom[0x3FFC:0x3FFE] = start.to_bytes(2, "little")
+    cpu = CPU()
+    cpu.setup(BUS(), rom)
+    return cpu
+
+
+def run(cpu, count):
+    for _ in range(count):
+        cpu.step()
+    return cpu.cycles - 7
+
+
+def test_base_cycles():
+    # LDA #$01, STA $0200, INC $10, NOP
+    cpu = make_cpu([0xA9, 0x01, 0x8D, 0x00, 0x02, 0xE6, 0x10, 0xEA])
+    assert run(cpu, 4) == 2 + 4 + 5 + 2
+
+
+def test_page_cross_cycles():
+    # LDX #$FF, LDA $02FF,X (crosses), LDA $0200,X (does not), STA $02FF,X
+    cpu = make_cpu([0xA2, 0xFF, 0xBD, 0xFF, 0x02, 0xBD, 0x00, 0x02, 0x9D, 0xFF, 0x02])
+    assert run(cpu, 4) == 2 + 5 + 4 + 5
+
+
+def test_branch_cycles():
+    # CLC, BCS +0 (not taken), BCC +0 (taken)
+    cpu = make_cpu([0x18, 0xB0, 0x00, 0x90, 0x00])
+    assert run(cpu, 3) == 2 + 2 + 3
+
+    # BNE -128 at 0xC100 jumps back to the previous page
+    cpu = make_cpu([0xD0, 0x80], start=0xC100)
+    assert run(cpu, 1) == 4
+
+
+def test_self_modifying_code():
+    # NOP, LDA #$E8, STA $C000 (NOP becomes INX), JMP $C000
+    cpu = make_cpu([0xEA, 0xA9, 0xE8, 0x8D, 0x00, 0xC0, 0x4C, 0x00, 0xC0])
+    run(cpu, 3)
+    assert cpu.decoded[0xC001] is None
+    run(cpu, 2)
+    assert cpu.x == 1
+
+
+def test_independent_cpus():
+    first = make_cpu([0xA9, 0x01])
+    second = make_cpu([0xA9, 0x02])
+    first.step()
+    second.step()
+    assert (first.a, second.a) == (0x01, 0x02)
+
+
+def test_irq():
+    # CLI, JMP $C001
+    cpu = make_cpu([0x58, 0x4C, 0x01, 0xC0])
+    assert not cpu.irq()
+    run(cpu, 1)
+    cycles = cpu.cycles
+    assert cpu.irq()
+    assert (cpu.pc, cpu.cycles - cycles) == (cpu.bus.read_double(0xFFFE), 7)
+    assert cpu.status & 0b00000100
+    # pc then status, B clear
+    assert [cpu.bus.read(0x01FD - i) for i in range(3)] == [0xC0, 0x01, 0x20]
@@ -0,0 +1,111 @@
+import pytest
+import signal
+
+from src.debugger import Console, Debugger, DebuggerError, opcodes
+
+from .test_state import make_nes
+
+# INX, CPX #$05, BNE $C000, BRK
+LOOP = [0xE8, 0xE0, 0x05, 0xD0, 0xFB, 0x00]
+
+
+def test_pc_breakpoints():
+    nes = make_nes(LOOP)
+    debugger = Debugger(nes)
+    breakpoint = debugger.add(0xC001, condition="x == 3")
+    result = debugger.resume()
+    assert result.reason == "break" and debugger.hit is breakpoint
+    assert (nes.cpu.pc, nes.cpu.x) == (0xC001, 3)
+
+    # continuing runs the instruction the breakpoint stopped at
+    assert debugger.step().reason == "instructions"
+    assert nes.cpu.pc == 0xC003
+    assert debugger.resume().reason == "halt"
+    assert nes.cpu.x == 5
+
+
+def test_opcode_and_watch():
+    nes = make_nes(LOOP)
+    debugger = Debugger(nes)
+    assert opcodes("bne") == {0xD0} and opcodes("0xea") == {0xEA}
+    with pytest.raises(DebuggerError):
+        opcodes("nope")
+
+    breakpoint = debugger.add(opcodes=opcodes("bne"))
+    assert debugger.resume().reason == "break"
+    assert nes.cpu.pc == 0xC003
+    debugger.remove(breakpoint.number)
+
+    # watches break when the condition becomes true
+    debugger.add(condition="x >= 3")
+    assert debugger.resume().reason == "break"
+    assert nes.cpu.x == 3
+    assert debugger.resume().reason == "halt"
+
+    with pytest.raises(DebuggerError):
+        debugger.add(condition="x ==")
+    with pytest.raises(DebuggerError, match="unknown names: z"):
+        debugger.add(0xC000, condition="z == 1")
+    with pytest.raises(DebuggerError):
+        debugger.remove(42)
+
+
+def test_breakpoint_at_start():
+    # a breakpoint at the pc a run starts at stops it before it runs anything,
+    # continuing from there moves on
+    nes = make_nes(LOOP)
+    debugger = Debugger(nes)
+    breakpoint = debugger.add(0xC000)
+    result = debugger.resume()
+    assert (result.reason, result.instructions) == ("break", 0)
+    assert debugger.hit is breakpoint and nes.cpu.pc == 0xC000
+    result = debugger.resume()
+    assert (result.reason, result.instructions) == ("break", 3)
+    assert nes.cpu.x == 1
+
+
+def test_unarmed():
+    # without breakpoints the plain loop runs and nothing is checked
+    nes = make_nes(LOOP)
+    debugger = Debugger(nes)
+    debugger.add(0xC001)
+    debugger.clear()
+    debugger.check = None
+    assert debugger.resume().reason == "halt"
+
+
+def test_console(capsys):
+    nes = make_nes(LOOP)
+    console = Console(Debugger(nes))
+    console.onecmd("break 0xc003 if x == 2")
+    console.onecmd("c")
+    output = capsys.readouterr().out
+    assert "breakpoint #1 pc 0xc003 if x == 2" in output
+    assert "pc=0xc003 a=0x00 x=0x02" in output
+    assert "0xc003: BNE $C000" in output
+
+    console.onecmd("mem 0xc000 6")
+    assert "0xc000: e8 e0 05 d0 fb 00" in capsys.readouterr().out
+    console.onecmd("break nowhere")
+    assert capsys.readouterr().out.startswith("error:")
+    console.onecmd("delete")
+    console.onecmd("c")
+    assert "stopped: halt" in capsys.readouterr().out
+    assert console.onecmd("quit")
+
+
+def test_console_errors(capsys):
+    # JMP $C000 forever, interrupted by Ctrl-C
+    nes = make_nes([0x4C, 0x00, 0xC0])
+    console = Console(Debugger(nes))
+    nes.scheduler.schedule(1000, lambda _: signal.raise_signal(signal.SIGINT))
+    console.onecmd("continue")
+    output = capsys.readouterr().out
+    assert "stopped: interrupted" in output and "pc=0xc000" in output
+    assert console.onecmd("step") is None
+    assert "pc=0xc000" in capsys.readouterr().out
+
+    nes = make_nes([0xE8, 0x02])
+    console = Console(Debugger(nes))
+    console.onecmd("step 2")
+    assert "error: illegal opcode 0x02 at 0xC001" in capsys.readouterr().out
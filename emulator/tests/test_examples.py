@@ -2,6 +2,13 @@ import os
 import pytest
 
 from src import cli
+from src.apu import APU
+from src.bus import BUS
+from src.cartridge import Cartridge
+from src.cpu import CPU
+from src.nes import NES
+from src.ppu import PPU
+from src.trace import CompareTrace, load_records
 from click.testing import CliRunner
 
 
@@ -30,16 +37,25 @@ def test_error():
     assert CliRunner().invoke(cli).exception
 
 
-@pytest.mark.parametrize("inpath, outpath", collect_examples())
-def test_example(inpath, outpath):
-    """Runs test against a single file in the examples dir"""
+def test_cli():
+    # the default pynesemu path, trace written to stdout by ThreadedTrace,
+    # checked against the longest expected trace
+    examples = collect_examples()
+    inpath, outpath = max(examples, key=lambda example: os.path.getsize(example[1]))
     result = CliRunner().invoke(cli, [inpath])
-
     if result.exception:
         raise result.exception
 
     with open(outpath) as f:
-        outlines = result.output.split("\n")
-        inlines = f.read().split("\n")
-        for i, (r, o) in enumerate(zip(outlines, inlines)):
-            assert r == o, "wrong output at line {}".format(i)
+        assert result.output.splitlines() == f.read().splitlines()
+
+
+@pytest.mark.parametrize("inpath, outpath", collect_examples())
+def test_example(inpath, outpath):
+    """Runs test against a single file in the examples dir"""
+    # every record is checked as the CPU produces it, the first difference
+    # raises TraceMismatch with the field and the instruction behind it
+    trace = CompareTrace(load_records(outpath))
+    nes = NES(CPU(), PPU(), BUS(), trace, apu=APU())
+    nes.run(Cartridge.open(inpath))
+    assert trace.done(), "missing output from line {}".format(trace.line)
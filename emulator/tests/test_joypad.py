@@ -0,0 +1,106 @@
+import pytest
+import sys
+import types
+
+from click.testing import CliRunner
+
+from src.apu import APU
+from src.bus import BUS
+from src.cpu import CPU
+from src.joypad import (
+    GamepadInput,
+    InputError,
+    Joypad,
+    KeyboardInput,
+    NullInput,
+    Ports,
+    ScriptedInput,
+    buttons,
+    parse_script,
+)
+from src.main import cli
+from src.nes import NES
+from src.ppu import PPU
+
+from .test_state import make_rom
+
+
+def test_parse_script():
+    script = parse_script("# title\n2 a+right\n\n1 START\n5 -\n")
+    assert script == [(1, 0x08), (2, 0x81), (5, 0)]
+
+
+def test_scripted():
+    source = ScriptedInput([(0, 0x01), (2, 0x08)])
+    states = [source.state]
+    for _ in range(3):
+        source.frame()
+        states.append(source.state)
+    assert states == [0x01, 0x01, 0x08, 0x08]
+
+
+def test_shift_register():
+    joypad = Joypad(NullInput(state=buttons(["a", "start", "right"])))
+    joypad.write(1)
+    assert joypad.read() == 1
+    assert joypad.read() == 1
+    joypad.write(0)
+    bits = [joypad.read() for _ in range(10)]
+    assert bits == [1, 0, 0, 1, 0, 0, 0, 1, 1, 1]
+
+    # the snapshot taken on the strobe is not affected by later changes
+    joypad.write(1)
+    joypad.write(0)
+    joypad.source.state = 0
+    assert joypad.read() == 1
+
+
+def test_keyboard():
+    class Key(object):
+        def __init__(self, char):
+            self.char = char
+
+    source = KeyboardInput()
+    source.press(Key("z"))
+    source.press(Key("x"))
+    source.release(Key("z"))
+    source.press(Key("q"))
+    assert source.state == 0x02
+
+
+def test_start_errors(monkeypatch, tmp_path):
+    # missing extras and devices are input errors, reported as bad parameters
+    monkeypatch.setitem(sys.modules, "pynput", None)
+    monkeypatch.setitem(sys.modules, "evdev", None)
+    with pytest.raises(InputError, match="needs pynput"):
+        KeyboardInput().start()
+    with pytest.raises(InputError, match="needs evdev"):
+        GamepadInput().start()
+
+    def device(path):
+        raise FileNotFoundError(2, "No such file or directory", path)
+
+    evdev = types.SimpleNamespace(list_devices=lambda: [], InputDevice=device)
+    monkeypatch.setitem(sys.modules, "evdev", evdev)
+    with pytest.raises(InputError, match="no gamepad found"):
+        GamepadInput().start()
+    with pytest.raises(InputError, match="cannot open gamepad /nowhere"):
+        GamepadInput("/nowhere").start()
+
+    path = tmp_path / "rom.nes"
+    path.write_bytes(make_rom([0x00]))
+    args = [str(path), "--input", "gamepad", "--gamepad", "/nowhere"]
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 2 and "cannot open gamepad" in result.output
+
+
+def test_read_controllers():
+    # strobe, then 8 reads of $4016 into $10 (LSR A, ROL $10), BRK
+    program = [0xA9, 0x01, 0x8D, 0x16, 0x40, 0xA9, 0x00, 0x8D, 0x16, 0x40]
+    program += [0xA2, 0x08, 0xAD, 0x16, 0x40, 0x4A, 0x26, 0x10, 0xCA, 0xD0, 0xF7]
+    program += [0x00]
+    ports = Ports(Joypad(ScriptedInput([(0, buttons(["a", "left"]))])))
+    nes = NES(CPU(), PPU(), BUS(), apu=APU(), ports=ports)
+    nes.run(make_rom(program))
+    # A is the first bit read, it ends up at the top
+    assert nes.bus.read(0x10) == 0b10000010
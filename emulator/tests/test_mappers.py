@@ -0,0 +1,138 @@
+import pytest
+
+from src.bus import BUS
+from src.cartridge import Cartridge
+from src.cpu import CPU
+from src.mappers import MapperError, create
+from src.nes import NES
+from src.ppu import HORIZONTAL, PPU, SINGLE_UPPER, VERTICAL
+
+from .test_cartridge import make_image
+
+
+def banks(count, size):
+    # every byte of bank i is i
+    return b"".join(bytes([i]) * size for i in range(count))
+
+
+def make_mapper(number, prg, chr=b""):
+    header = [len(prg) // 0x4000, len(chr) // 0x2000, number << 4]
+    cartridge = Cartridge.parse(make_image(header, prg, chr))
+    bus, ppu = BUS(), PPU()
+    ppu.setup(bus, cartridge.chr, cartridge.mirroring)
+    mapper = create(cartridge)
+    mapper.setup(bus, ppu)
+    return mapper, bus, ppu
+
+
+def serial(bus, addr, value):
+    # MMC1 registers are written lsb first, one bit per write
+    for bit in range(5):
+        bus.write(addr, (value >> bit) & 1)
+
+
+def test_uxrom():
+    mapper, bus, _ = make_mapper(2, banks(4, 0x4000))
+    assert (bus.read(0x8000), bus.read(0xFFFF)) == (0, 3)
+    bus.write(0x8000, 2)
+    assert (bus.read(0xBFFF), bus.read(0xC000)) == (2, 3)
+    # banks wrap around and the ROM itself is never written
+    bus.write(0xC123, 5)
+    assert (bus.read(0x8000), bus.read(0xC123)) == (1, 3)
+
+
+def test_cnrom():
+    _, bus, ppu = make_mapper(3, banks(1, 0x4000), banks(8, 0x1000))
+    assert (bus.read(0x8000), bus.read(0xC000)) == (0, 0)
+    assert (ppu.vram_read(0x0000), ppu.vram_read(0x1000)) == (0, 1)
+    bus.write(0x8000, 2)
+    assert (ppu.vram_read(0x0000), ppu.vram_read(0x1FFF)) == (4, 5)
+
+
+def test_mmc1():
+    _, bus, ppu = make_mapper(1, banks(8, 0x4000), banks(4, 0x1000))
+    # power on: last bank fixed at $C000
+    assert (bus.read(0x8000), bus.read(0xC000)) == (0, 7)
+    serial(bus, 0xE000, 5)
+    assert (bus.read(0x8000), bus.read(0xC000)) == (5, 7)
+
+    # first bank fixed at $8000, vertical mirroring
+    serial(bus, 0x8000, 0x0A)
+    assert (bus.read(0x8000), bus.read(0xC000)) == (0, 5)
+    assert ppu.mirroring == VERTICAL
+    # 32KB mode ignores the low bit
+    serial(bus, 0x8000, 0x01)
+    assert (bus.read(0x8000), bus.read(0xC000)) == (4, 5)
+    assert ppu.mirroring == SINGLE_UPPER
+
+    # 4KB CHR banks
+    serial(bus, 0x8000, 0x13)
+    serial(bus, 0xA000, 2)
+    serial(bus, 0xC000, 3)
+    assert (ppu.vram_read(0x0000), ppu.vram_read(0x1000)) == (2, 3)
+    assert ppu.mirroring == HORIZONTAL
+    # 8KB CHR banks
+    serial(bus, 0x8000, 0x03)
+    assert (ppu.vram_read(0x0000), ppu.vram_read(0x1000)) == (2, 3)
+    serial(bus, 0xA000, 1)
+    assert (ppu.vram_read(0x0000), ppu.vram_read(0x1000)) == (0, 1)
+
+    # a write with bit 7 set resets the shift register
+    bus.write(0xE000, 1)
+    bus.write(0xE000, 0x80)
+    serial(bus, 0xE000, 6)
+    assert (bus.read(0x8000), bus.read(0xC000)) == (6, 7)
+
+
+def test_mmc1_mirrored_prg():
+    # 16KB of PRG in 32KB mode shows at $8000 and $C000, a write to $E000
+    # still reaches the PRG register
+    mapper, bus, _ = make_mapper(1, banks(1, 0x4000))
+    serial(bus, 0x8000, 0x00)
+    assert (bus.read(0x8000), bus.read(0xC000)) == (0, 0)
+    serial(bus, 0xE000, 5)
+    assert mapper.registers == bytes([0x10, 0x00, 0x00, 0x00, 0x05])
+
+
+def test_unsupported():
+    cartridge = Cartridge.parse(make_image([1, 0, 0x40], bytes(0x4000)))
+    with pytest.raises(MapperError):
+        create(cartridge)
+
+
+def test_switch_decoded_code():
+    # LDX #$11 / LDX #$22, RTS in banks 0 and 1, the fixed bank calls both
+    prg = bytearray(3 * 0x4000)
+    prg[0x0000:0x0003] = [0xA2, 0x11, 0x60]
+    prg[0x4000:0x4003] = [0xA2, 0x22, 0x60]
+    prg[0x8000:0x8010] = [
+        *(0x20, 0x00, 0x80),  # JSR $8000
+        *(0x86, 0x10),  # STX $10
+        *(0xA9, 0x01),  # LDA #$01
+        *(0x8D, 0x00, 0x80),  # STA $8000
+        *(0x20, 0x00, 0x80),  # JSR $8000
+        *(0x86, 0x11),  # STX $11
+        0x00,  # BRK
+    ]
+    prg[-4:-2] = b"\x00\xc0"
+    nes = NES(CPU(), None, BUS())
+    result = nes.run(make_image([3, 0, 0x20], bytes(prg)))
+    assert result.reason == "halt"
+    assert (nes.bus.read(0x10), nes.bus.read(0x11)) == (0x11, 0x22)
+
+    # the selected bank is restored with the state
+    blob = nes.save_state()
+    nes.bus.write(0x8000, 0)
+    nes.load_state(blob)
+    assert nes.bus.read(0x8000) == 0xA2 and nes.bus.read(0x8001) == 0x22
+
+
+def test_register_writes_keep_code():
+    # LDA #$00, STA $C000 (over its own code), BRK: the bank stays the same
+    # and the decoded instructions are kept
+    prg = bytearray(2 * 0x4000)
+    prg[0x4000:0x4006] = [0xA9, 0x00, 0x8D, 0x00, 0xC0, 0x00]
+    prg[-4:-2] = b"\x00\xc0"
+    nes = NES(CPU(), None, BUS())
+    assert nes.run(make_image([2, 0, 0x20], bytes(prg))).reason == "halt"
+    assert 0xC000 in nes.cpu.filled
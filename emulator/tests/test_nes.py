@@ -0,0 +1,85 @@
+import io
+
+from src.apu import APU
+from src.bus import BUS
+from src.cpu import CPU
+from src.nes import CYCLES_PER_FRAME, NES
+from src.ppu import PPU
+from src.trace import ThreadedTrace
+
+from .test_state import make_nes, make_rom
+
+# INX, JMP $C000
+LOOP = [0xE8, 0x4C, 0x00, 0xC0]
+
+
+def test_halt():
+    # LDX #$05, BRK
+    nes = make_nes([0xA2, 0x05, 0x00])
+    result = nes.run()
+    assert (result.reason, result.instructions, nes.cpu.x) == ("halt", 2, 5)
+    assert nes.cpu.halted
+
+
+def test_budgets():
+    nes = make_nes(LOOP)
+    assert nes.run(max_instructions=10).reason == "instructions"
+    assert nes.cpu.x == 5
+
+    result = nes.run(max_cycles=100)
+    assert result.reason == "cycles"
+    assert result.cycles >= 100
+
+    result = nes.run(max_frames=2)
+    assert (result.reason, result.frames) == ("frames", 2)
+
+    assert nes.run(stop_pc=0xC001).reason == "pc"
+    assert nes.cpu.pc == 0xC001
+    assert CYCLES_PER_FRAME == 29781
+
+
+def test_resumed_trace():
+    # the sink stays open across runs and is closed with the emulator
+    stream = io.StringIO()
+    nes = NES(CPU(), None, BUS(), ThreadedTrace(stream, batch=2))
+    nes.insert(make_rom(LOOP))
+    for _ in range(20):
+        nes.run(max_instructions=5)
+    nes.close()
+    assert len(stream.getvalue().splitlines()) == 100
+
+
+def test_display():
+    class Display(object):
+        frames = 0
+
+        def present(self, framebuffer):
+            assert framebuffer.shape == (240, 256)
+            self.frames += 1
+            return self.frames < 3
+
+    nes = make_nes(LOOP, PPU())
+    nes.display = Display()
+    result = nes.run(max_frames=10)
+    assert (result.reason, nes.display.frames) == ("closed", 3)
+
+
+def test_nmi():
+    # LDA #$80, STA $2000, JMP *; NMI: INC $10, RTI
+    program = [0xA9, 0x80, 0x8D, 0x00, 0x20, 0x4C, 0x05, 0xC0]
+    program += [0xE6, 0x10, 0x40]
+    rom = make_rom(program)
+    rom[-6:-4] = b"\x08\xc0"
+    nes = NES(CPU(), PPU(), BUS())
+    result = nes.run(rom, max_frames=3)
+    assert (result.reason, nes.bus.read(0x10)) == ("frames", 3)
+    assert nes.cpu.pc == 0xC005
+
+
+def test_oam_dma():
+    # LDA #$07, STA $0203, LDA #$02, STA $4014, BRK
+    program = [0xA9, 0x07, 0x8D, 0x03, 0x02, 0xA9, 0x02, 0x8D, 0x14, 0x40, 0x00]
+    nes = NES(CPU(), PPU(), BUS(), apu=APU())
+    nes.run(make_rom(program))
+    assert nes.ppu.oam[3] == 0x07
+    assert nes.cpu.cycles > 513
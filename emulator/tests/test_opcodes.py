@@ -0,0 +1,33 @@
+import pytest
+
+from src.cpu import IllegalOpcode
+from src.opcodes import MODES, OPCODES, disassemble
+
+from .test_cpu import make_cpu
+
+SIZES = {"imp": 1, "acc": 1, "imm": 2, "zp": 2, "zpx": 2, "zpy": 2, "rel": 2}
+
+
+def test_spec():
+    opcodes = [op for op in OPCODES if op is not None]
+    assert len(opcodes) == 151
+    for op in opcodes:
+        assert op.mode in MODES
+        assert op.size == SIZES.get(op.mode, 2 if op.mode in ("indx", "indy") else 3)
+
+
+def test_disassemble():
+    program = [0xBD, 0x00, 0x02, 0xD0, 0xFB, 0x0A, 0xB1, 0x10, 0x02]
+    read = lambda addr: program[addr]
+    assert disassemble(read, 0) == "LDA $0200,X"
+    assert disassemble(read, 3) == "BNE $0000"
+    assert disassemble(read, 5) == "ASL A"
+    assert disassemble(read, 6) == "LDA ($10),Y"
+    assert disassemble(read, 8) == ".db $02"
+
+
+def test_illegal_opcode():
+    cpu = make_cpu([0xEA, 0x02])
+    cpu.step()
+    with pytest.raises(IllegalOpcode, match="0x02 at 0xC001"):
+        cpu.step()
@@ -0,0 +1,115 @@
+import numpy as np
+
+from src.bus import BUS
+from src.ppu import CYCLES_PER_FRAME, PPU, VBLANK, VERTICAL
+from src.scheduler import Scheduler
+
+
+def make_ppu(chr_rom=b"", mirroring=VERTICAL):
+    bus = BUS()
+    ppu = PPU()
+    ppu.setup(bus, chr_rom, mirroring)
+    return ppu, bus
+
+
+def poke(bus, addr, values):
+    bus.write(0x2006, addr >> 8)
+    bus.write(0x2006, addr & 0xFF)
+    for value in values:
+        bus.write(0x2007, value)
+
+
+def test_registers():
+    ppu, bus = make_ppu()
+    # write only registers read back the open bus, mirrored every 8 bytes
+    bus.write(0x39F0, 0x42)
+    assert bus.read(0x2000) == 0x42
+
+    poke(bus, 0x2400, [1, 2, 3])
+    # vertical mirroring: $2C00 is $2400
+    bus.write(0x2006, 0x2C)
+    bus.write(0x2006, 0x00)
+    # reads of the nametables are delayed by one
+    assert [bus.read(0x2007) for _ in range(4)] == [0, 1, 2, 3]
+
+    poke(bus, 0x3F10, [0x30])
+    assert ppu.palette[0] == 0x30
+
+
+def test_vblank():
+    ppu, bus = make_ppu()
+    scheduler = Scheduler()
+    nmis, frames = [], []
+    ppu.attach(scheduler, lambda: nmis.append(1), frames.append)
+    assert scheduler.deadline == VBLANK
+
+    assert scheduler.run(VBLANK) > VBLANK
+    assert bus.read(0x2002) & 0x80
+    assert not bus.read(0x2002) & 0x80
+    assert scheduler.run(CYCLES_PER_FRAME) == CYCLES_PER_FRAME + VBLANK
+    assert (ppu.frames, len(frames), nmis) == (1, 1, [])
+
+    # enabling NMI in vblank raises it at once
+    scheduler.run(CYCLES_PER_FRAME + VBLANK)
+    bus.write(0x2000, 0x80)
+    scheduler.run(CYCLES_PER_FRAME + VBLANK)
+    assert nmis == [1]
+
+
+def test_render_background():
+    # tile 1 is solid color 3
+    chr_rom = bytearray(0x2000)
+    chr_rom[0x10:0x20] = b"\xff" * 16
+    ppu, bus = make_ppu(bytes(chr_rom))
+    poke(bus, 0x3F00, [0x0F, 0x01, 0x02, 0x03, 0x0F, 0x11, 0x12, 0x13])
+    # second tile of the first row, attribute palette 1 for the top left
+    poke(bus, 0x2001, [1])
+    poke(bus, 0x23C0, [0x01])
+    bus.write(0x2006, 0)
+    bus.write(0x2006, 0)
+    bus.write(0x2001, 0x0A)
+
+    frame = ppu.render_background()
+    assert frame.shape == (240, 256)
+    assert frame.dtype == np.uint8
+    assert (frame[:8, 8:16] == 0x13).all()
+    assert (frame[:8, :8] == 0x0F).all()
+    assert (frame[8:] == 0x0F).all()
+
+    # scrolling 8 pixels right moves the tile to the left edge
+    bus.write(0x2005, 8)
+    bus.write(0x2005, 0)
+    assert (ppu.render_background()[:8, :8] == 0x13).all()
+
+
+def test_chr_ram():
+    ppu, bus = make_ppu()
+    bus.write(0x2001, 0x0A)
+    poke(bus, 0x3F00, [0x0F, 0x01, 0x02, 0x03])
+    assert (ppu.render_background() == 0x0F).all()
+
+    # tile 0 uploaded to CHR RAM as solid color 1
+    poke(bus, 0x0000, [0xFF] * 8 + [0x00] * 8)
+    bus.write(0x2006, 0)
+    bus.write(0x2006, 0)
+    assert (ppu.render_background() == 0x01).all()
+
+
+def test_small_chr():
+    # a single 4KB bank shows in both pattern tables
+    ppu, bus = make_ppu(bytes([0xFF] * 8) + bytes(0x0FF8))
+    assert ppu.vram_read(0x1000) == 0xFF
+    bus.write(0x2000, 0x10)
+    bus.write(0x2001, 0x0A)
+    poke(bus, 0x3F00, [0x0F, 0x01])
+    assert (ppu.render_background() == 0x01).all()
+
+
+def test_state():
+    ppu, bus = make_ppu()
+    poke(bus, 0x2000, [7])
+    data = ppu.save_state()
+    poke(bus, 0x2000, [9])
+    ppu.load_state(data)
+    assert ppu.vram[0] == 7
+    assert ppu.save_state() == data
@@ -0,0 +1,43 @@
+from src.rewind import Rewind
+
+from .test_state import make_nes
+
+
+def run_frames(nes, rewind, frames):
+    states = []
+    for _ in range(frames):
+        for _ in range(5):
+            nes.cpu.step()
+        rewind.push()
+        states.append(nes.save_state())
+    return states
+
+
+def test_rewind():
+    # INX, STX $10, JMP $C000
+    nes = make_nes([0xE8, 0x86, 0x10, 0x4C, 0x00, 0xC0])
+    rewind = Rewind(nes, interval=4)
+    states = run_frames(nes, rewind, 20)
+
+    assert rewind.rewind() == 1
+    assert nes.save_state() == states[-2]
+    assert rewind.rewind(9) == 9
+    assert nes.save_state() == states[-11]
+
+    states = states[:-10] + run_frames(nes, rewind, 3)
+    assert rewind.rewind(5) == 5
+    assert nes.save_state() == states[-6]
+    assert rewind.rewind(100) == len(states) - 6
+    assert nes.save_state() == states[0]
+
+
+def test_bounded():
+    nes = make_nes([0xE8, 0x86, 0x10, 0x4C, 0x00, 0xC0])
+    rewind = Rewind(nes, seconds=1, interval=10)
+    run_frames(nes, rewind, 100)
+    assert len(rewind) == 60
+
+    rewind = Rewind(nes, interval=10, budget=2000)
+    run_frames(nes, rewind, 100)
+    assert rewind.size <= 2000
+    assert 0 < len(rewind) < 100
@@ -0,0 +1,26 @@
+from src.scheduler import NEVER, Scheduler
+
+
+def test_order():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule(20, fired.append)
+    scheduler.schedule(10, fired.append)
+    event = scheduler.schedule(15, fired.append)
+    scheduler.cancel(event)
+    assert scheduler.deadline == 10
+
+    assert scheduler.run(9) == 10
+    assert scheduler.run(30) == NEVER
+    assert fired == [10, 20]
+
+
+def test_stop():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule(10, lambda cycle: scheduler.stop("done"))
+    scheduler.schedule(10, fired.append)
+    assert scheduler.run(10) is None
+    assert (scheduler.resume(), fired) == ("done", [])
+    assert scheduler.run(10) == NEVER
+    assert fired == [10]
@@ -0,0 +1,33 @@
+import numpy as np
+import os
+import pytest
+import subprocess
+import sys
+
+pygame = pytest.importorskip("pygame")
+
+
+@pytest.fixture
+def screen(monkeypatch):
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    from src.screen import Screen
+
+    screen = Screen(scale=2, fps=1000)
+    screen.open()
+    yield screen
+    screen.close()
+
+
+def test_present(screen):
+    frame = np.zeros((240, 256), dtype=np.uint8)
+    frame[10, 20] = 0x16
+    assert screen.present(frame)
+    assert screen.window.get_size() == (512, 480)
+    assert tuple(screen.window.get_at((41, 21)))[:3] == (0xF8, 0x38, 0x00)
+    assert tuple(screen.window.get_at((0, 0)))[:3] == (0x7C, 0x7C, 0x7C)
+
+
+def test_headless_without_pygame():
+    code = "import sys, src.main; sys.exit('pygame' in sys.modules)"
+    root = os.path.dirname(os.path.dirname(__file__))
+    assert subprocess.call([sys.executable, "-c", code], cwd=root) == 0
@@ -0,0 +1,46 @@
+import pytest
+
+from src.bus import BUS
+from src.cpu import CPU
+from src.nes import NES
+from src.state import StateError, load, save
+
+
+def make_rom(program):
+    # iNES image with one PRG bank, RESET points to the program at $C000
+    rom = bytearray(b"NES\x1a\x01\x00" + bytes(10) + bytes(0x4000))
+    rom[16 : 16 + len(program)] = program
+    rom[-4:-2] = b"\x00\xc0"
+    return rom
+
+
+def make_nes(program, ppu=None):
+    nes = NES(CPU(), ppu, BUS())
+    nes.insert(make_rom(program))
+    return nes
+
+
+def test_round_trip(tmp_path):
+    # INX, STX $10, JMP $C000
+    nes = make_nes([0xE8, 0x86, 0x10, 0x4C, 0x00, 0xC0])
+    for _ in range(6):
+        nes.cpu.step()
+    path = str(tmp_path / "state.bin")
+    save(path, nes.save_state())
+
+    for _ in range(30):
+        nes.cpu.step()
+    assert nes.bus.read(0x10) == 12
+
+    nes.load_state(load(path))
+    assert (nes.cpu.pc, nes.cpu.x, nes.bus.read(0x10)) == (0xC000, 2, 2)
+    assert nes.cpu.cycles == 7 + 2 * (2 + 3 + 3)
+
+
+def test_invalid_state():
+    nes = make_nes([])
+    blob = nes.save_state()
+    with pytest.raises(StateError):
+        nes.load_state(b"XXXX" + blob[4:])
+    with pytest.raises(StateError):
+        nes.load_state(blob[:-1])
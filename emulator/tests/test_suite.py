@@ -0,0 +1,22 @@
+from src.suite import run_suite, run_test
+
+from .test_state import make_rom
+
+
+def test_errors(tmp_path):
+    (tmp_path / "illegal").write_bytes(make_rom([0x02]))
+    (tmp_path / "illegal.r").write_text("")
+    (tmp_path / "missing").write_bytes(make_rom([0x00]))
+    result = run_test("illegal", str(tmp_path / "illegal"), str(tmp_path / "illegal.r"))
+    assert not result.passed and "IllegalOpcode" in result.message
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name in ["illegal", "missing"]:
+        (bin_dir / name).write_bytes((tmp_path / name).read_bytes())
+    results = list(run_suite(str(bin_dir), str(tmp_path), jobs=1))
+    assert [(r.name, r.passed) for r in results] == [
+        ("illegal", False),
+        ("missing", False),
+    ]
+    assert "FileNotFoundError" in results[1].message
@@ -0,0 +1,39 @@
+from src.tiles import TileCache, decode
+
+
+def test_decode():
+    # row 0: low plane 0x80, high plane 0x01 -> 1 at the left, 2 at the right
+    tile = bytes([0x80] + [0] * 7 + [0x01] + [0] * 7)
+    pixels = decode(tile)
+    assert pixels.shape == (1, 8, 8)
+    assert list(pixels[0, 0]) == [1, 0, 0, 0, 0, 0, 0, 2]
+
+
+def test_invalidate():
+    data = bytearray(0x2000)
+    cache = TileCache(data)
+    assert cache.tiles.shape == (512, 8, 8)
+
+    data[0x1010] = 0xFF
+    cache.invalidate(0x1010)
+    assert not cache.pattern(0)[1].any()
+    assert list(cache.pattern(1)[1, 0]) == [1] * 8
+
+
+def test_colored():
+    data = bytearray(0x2000)
+    data[0x10:0x20] = b"\xff" * 16
+    cache = TileCache(data, size=2)
+    palette = bytes(range(0x20, 0x30))
+
+    colored = cache.colored(0, palette)
+    assert colored.shape == (4, 256, 8, 8)
+    # color 0 is the backdrop on every palette
+    assert (colored[:, 0] == 0x20).all()
+    assert list(colored[:, 1, 0, 0]) == [0x23, 0x27, 0x2B, 0x2F]
+    assert cache.colored(0, palette) is colored
+
+    cache.colored(1, palette)
+    cache.colored(0, bytes(16))
+    assert len(cache.variants) == 2
+    assert cache.colored(0, palette) is not colored
@@ -0,0 +1,96 @@
+import io
+import pytest
+
+from src.bus import BUS
+from src.cpu import CPU
+from src.trace import (
+    BufferTrace,
+    CompareTrace,
+    ThreadedTrace,
+    TraceMismatch,
+    format_record,
+    parse_record,
+    snapshot,
+)
+
+
+def make_cpu():
+    bus = BUS()
+    cpu = CPU()
+    rom = bytearray(0x4000)
+    rom[0x3FFC:0x3FFE] = b"\x00\xc0"
+    cpu.setup(bus, rom)
+    bus.write(0x0010, 0x42)
+    return cpu
+
+
+def test_format():
+    cpu = make_cpu()
+    assert format_record(snapshot(cpu)) == (
+        "| pc = 0xc000 | a = 0x00 | x = 0x00 | y = 0x00 "
+        "| sp = 0x01fd | p[NV-BDIZC] = 00110100 |"
+    )
+    assert format_record(snapshot(cpu, 0x0810)).endswith(" MEM[0x0010] = 0x42 |")
+
+
+def test_sinks_match():
+    cpu = make_cpu()
+    buffer = BufferTrace()
+    stream = io.StringIO()
+    threaded = ThreadedTrace(stream, batch=3)
+    for address in [None, 0x10, 0x810, None, 0x1810]:
+        buffer.record(cpu, address)
+        threaded.record(cpu, address)
+    threaded.close()
+    assert stream.getvalue() == "\n".join(buffer.lines()) + "\n"
+
+
+class BrokenStream(object):
+    def write(self, data):
+        raise BrokenPipeError(32, "Broken pipe")
+
+    def flush(self):
+        pass
+
+
+def test_threaded_write_error():
+    # the writer keeps draining after a failed write, the error is raised on
+    # the emulator thread instead of blocking it
+    cpu = make_cpu()
+    trace = ThreadedTrace(BrokenStream(), batch=1)
+    with pytest.raises(BrokenPipeError):
+        for _ in range(100):
+            trace.record(cpu)
+    with pytest.raises(BrokenPipeError):
+        trace.close()
+    assert not trace.thread.is_alive()
+
+
+def test_parse():
+    cpu = make_cpu()
+    for address in [None, 0x810]:
+        record = snapshot(cpu, address)
+        assert parse_record(format_record(record)) == record
+    with pytest.raises(ValueError):
+        parse_record("| pc = 0xc000 |")
+
+
+def test_compare():
+    cpu = make_cpu()
+    record = snapshot(cpu, 0x10)
+    trace = CompareTrace([record, record])
+    trace.record(cpu, 0x10)
+    assert not trace.done()
+    trace.record(cpu, 0x10)
+    assert trace.done()
+    with pytest.raises(TraceMismatch, match="unexpected line 2"):
+        trace.record(cpu)
+
+    # the first different field and the instruction behind it are reported
+    cpu.x = 1
+    trace = CompareTrace([record])
+    with pytest.raises(TraceMismatch) as error:
+        trace.record(cpu, 0x10)
+    message = str(error.value)
+    assert message.startswith("wrong x at line 0: 0x01 instead of 0x00")
+    assert "after    0xc000: BRK" in message